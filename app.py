@@ -1,66 +1,98 @@
+import os
 import streamlit as st
 import sqlite3
 import pandas as pd
-import io
-from fpdf import FPDF
-from werkzeug.security import generate_password_hash, check_password_hash
+from syscontabil import db, cache, periodos, fiscal, usuarios, tarefas
+from syscontabil.esquema import init_db
+from syscontabil.contas import plano_de_contas, contas_da_empresa, importar_plano_padrao
+from syscontabil.lancamentos import lancar, excluir_lancamento, tem_lancamentos, listar_lancamentos, verificar_saldos, reconstruir_saldos
+from syscontabil.relatorios import balancete, faturamento_12m, metricas_dashboard, evolucao_diaria
+from syscontabil.leitor_ofx import ler_ofx_lote
+from syscontabil.periodos import is_periodo_fechado
 
 # --- 1. CONFIGURAÇÃO E FUNÇÕES AUXILIARES ---
 st.set_page_config(page_title="SysContábil SaaS", layout="wide", page_icon="⚖️")
-DB_NAME = "syscontabil_v5.db"
-
-def get_db():
-    conn = sqlite3.connect(DB_NAME, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-def init_db():
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('CREATE TABLE IF NOT EXISTS usuarios (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, password TEXT, nome_completo TEXT)')
-        cursor.execute('CREATE TABLE IF NOT EXISTS empresas (id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT, cnpj TEXT, regime TEXT, usuario_id INTEGER, FOREIGN KEY(usuario_id) REFERENCES usuarios(id))')
-        cursor.execute('CREATE TABLE IF NOT EXISTS plano_contas (id INTEGER PRIMARY KEY AUTOINCREMENT, empresa_id INTEGER, cod TEXT, nome TEXT, grupo TEXT, FOREIGN KEY(empresa_id) REFERENCES empresas(id))')
-        cursor.execute('CREATE TABLE IF NOT EXISTS lancamentos (id INTEGER PRIMARY KEY AUTOINCREMENT, empresa_id INTEGER, data TEXT, conta_debito TEXT, conta_credito TEXT, valor REAL, historico TEXT, FOREIGN KEY(empresa_id) REFERENCES empresas(id))')
-        cursor.execute('CREATE TABLE IF NOT EXISTS fechamentos (id INTEGER PRIMARY KEY AUTOINCREMENT, empresa_id INTEGER, mes_ano TEXT, UNIQUE(empresa_id, mes_ano), FOREIGN KEY(empresa_id) REFERENCES empresas(id))')
-        conn.commit()
-
-def is_periodo_fechado(emp_id, data_str):
-    mes_ano = str(data_str)[:7] # YYYY-MM
-    with get_db() as conn:
-        res = conn.execute("SELECT 1 FROM fechamentos WHERE empresa_id=? AND mes_ano=?", (emp_id, mes_ano)).fetchone()
-    return True if res else False
-
-def importar_plano_padrao(emp_id):
-    plano = [
-        ("1.01.01", "Caixa Geral", "Ativo"), ("1.01.02", "Banco Movimento", "Ativo"),
-        ("1.09.99", "A Classificar (Entradas)", "Ativo"), ("2.09.99", "A Classificar (Saídas)", "Passivo"),
-        ("2.01.01", "Fornecedores", "Passivo"), ("3.01.01", "Capital Social", "Patrimônio Líquido"),
-        ("4.01.01", "Receitas de Vendas", "Receita"), ("5.01.01", "Despesas Operacionais", "Despesa"),
-        ("5.01.04", "Provisão de Impostos", "Despesa"), ("2.01.03", "Impostos a Recolher", "Passivo")
-    ]
-    with get_db() as conn:
-        conn.executemany("INSERT INTO plano_contas (empresa_id, cod, nome, grupo) VALUES (?, ?, ?, ?)", 
-                       [(emp_id, c, n, g) for c, n, g in plano])
-        conn.commit()
-
-def gerar_pdf(df, titulo):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", 'B', 16)
-    pdf.cell(190, 10, titulo, ln=True, align='C')
-    pdf.ln(10)
-    pdf.set_font("Arial", 'B', 10)
-    for col in df.columns:
-        pdf.cell(40, 10, str(col), 1)
-    pdf.ln()
-    pdf.set_font("Arial", '', 10)
-    for _, row in df.iterrows():
-        for val in row:
-            pdf.cell(40, 10, str(val), 1)
-        pdf.ln()
-    return pdf.output(dest='S').encode('latin-1')
 
+ROTULOS_TAREFA = {'importar_csv': "Importação CSV", 'importar_ofx': "Extrato OFX", 'provisionar': "Provisão de Impostos", 'pdf': "PDF"}
+
+def ler_arquivo(caminho):
+    """Conteúdo do arquivo lido só no clique do download_button."""
+    def ler():
+        with open(caminho, 'rb') as f:
+            return f.read()
+    return ler
+
+def enfileirar(emp_id, tipo, parametros=None, entrada=None):
+    """Põe a operação na fila do usuário; a mesma operação ainda na fila ou em execução não é duplicada."""
+    tarefas.enfileirar(st.session_state.user_id, emp_id, tipo, parametros, entrada)
+
+def enfileirar_pdf(emp_id, tipo, data_ini=None, data_fim=None, conta_id=None):
+    enfileirar(emp_id, 'pdf', {'tipo': tipo, 'data_ini': data_ini and str(data_ini), 'data_fim': data_fim and str(data_fim), 'conta_id': conta_id})
+
+def mostrar_resultado(t):
+    r = t['resultado']
+    if t['situacao'] == 'falhou':
+        st.error(f"Falha ao gerar o PDF: {t['mensagem']}" if t['tipo'] == 'pdf' else f"Operação desfeita, nada foi gravado: {t['mensagem']}")
+    elif t['situacao'] == 'cancelada':
+        st.info(t['mensagem'])
+    elif not r:
+        st.success(t['mensagem'] or "Concluída.")
+    elif t['tipo'] == 'importar_csv':
+        st.success(f"Importação concluída! {r['aceitos']} lançamento(s) gravado(s).")
+        if r['rejeitados']:
+            st.warning(f"{r['rejeitados']} linha(s) rejeitada(s).")
+            st.table(pd.Series(r['motivos'], name='linhas'))
+            st.dataframe(pd.DataFrame(r['amostra']['data'], columns=r['amostra']['columns']), use_container_width=True, hide_index=True)
+    elif t['tipo'] == 'importar_ofx':
+        st.success(f"Extrato processado com contas de classificação automática: {r['gravados']} lançamento(s).")
+        if r['repetidos']: st.info(f"{r['repetidos']} transação(ões) já importada(s) foram ignoradas.")
+        if r['fechados']: st.warning(f"{r['fechados']} transação(ões) em período fechado foram ignoradas.")
+    elif t['tipo'] == 'provisionar':
+        resumo = pd.DataFrame(r['resumo']['data'], columns=r['resumo']['columns'])
+        st.success(f"{(resumo['situacao'] == 'provisionado').sum()} empresa(s)/mês provisionado(s).")
+        pulados = resumo[resumo['situacao'] != 'provisionado']
+        if not pulados.empty:
+            st.warning(f"{len(pulados)} empresa(s)/mês não provisionado(s). Sem contas de provisão, cadastre {fiscal.CONTA_PROVISAO} e {fiscal.CONTA_RECOLHER} no plano.")
+            st.dataframe(pulados, use_container_width=True, hide_index=True)
+    elif t['tipo'] == 'pdf':
+        if os.path.exists(r['caminho']):
+            st.download_button("📥 Baixar PDF", ler_arquivo(r['caminho']), f"{t['parametros']['tipo']}.pdf", mime="application/pdf", key=f"baixar_{t['id']}")
+        else:
+            st.info("Os dados da empresa mudaram desde a geração deste PDF; gere de novo.")
+
+def painel_tarefas(tipos, limite=5):
+    """Últimas tarefas do usuário destes tipos; enquanto houver alguma ativa, o painel se atualiza a cada segundo."""
+    ativas = any(t['situacao'] in tarefas.ATIVAS for t in tarefas.listar(st.session_state.user_id, tipos, limite))
+
+    @st.fragment(run_every=1.0 if ativas else None)
+    def painel():
+        lista = tarefas.listar(st.session_state.user_id, tipos, limite)
+        if lista: st.subheader("Tarefas")
+        for t in lista:
+            empresas_t = t['parametros'].get('empresas', [t['empresa_id']])
+            alvo = emp_dict.get(empresas_t[0], "") if len(empresas_t) == 1 else f"{len(empresas_t)} empresas"
+            with st.container(border=True):
+                c1, c2 = st.columns([5, 1])
+                c1.write(f"**#{t['id']} {ROTULOS_TAREFA[t['tipo']]}** · {alvo} · {t['criada_em']}")
+                if t['situacao'] in tarefas.ATIVAS:
+                    c1.progress(min(t['progresso'], 1.0), text=t['mensagem'] or "Na fila...")
+                    if c2.button("Cancelar", key=f"cancelar_{t['id']}"): tarefas.cancelar(t['id'])
+                else:
+                    with c1: mostrar_resultado(t)
+        # A última tarefa ativa terminou: a página inteira roda de novo para refletir o que foi gravado
+        if ativas and not any(t['situacao'] in tarefas.ATIVAS for t in lista):
+            st.rerun()
+    painel()
+
+@st.cache_data(show_spinner="Lendo extratos...")
+def ler_extratos(arquivos):
+    return ler_ofx_lote(arquivos)
+
+# Cada sessão do Streamlit reaproveita a mesma conexão entre as reexecuções do script
+db.vincular(db.conexao_da_sessao(st.session_state))
+db.iniciar_rodada()
 init_db()
+tarefas.iniciar()
 
 # --- 2. AUTENTICAÇÃO ---
 if 'auth' not in st.session_state:
@@ -73,22 +105,21 @@ if not st.session_state.auth:
         u = st.text_input("Usuário", key="l_u")
         p = st.text_input("Senha", type="password", key="l_p")
         if st.button("Entrar", use_container_width=True):
-            with get_db() as conn:
-                user = conn.execute('SELECT * FROM usuarios WHERE username = ?', (u,)).fetchone()
-                if user and check_password_hash(user['password'], p):
-                    st.session_state.auth, st.session_state.user_id = True, user['id']
-                    st.rerun()
-                else: st.error("Acesso negado.")
+            user_id = usuarios.autenticar(u, p)
+            if user_id:
+                st.session_state.auth, st.session_state.user_id = True, user_id
+                st.rerun()
+            else: st.error("Acesso negado.")
     with t2:
         nu, nome, np = st.text_input("Novo Usuário", key="r_u"), st.text_input("Nome", key="r_n"), st.text_input("Senha", type="password", key="r_p")
         if st.button("Criar Conta"):
-            with get_db() as conn:
-                conn.execute('INSERT INTO usuarios (username, password, nome_completo) VALUES (?,?,?)', (nu, generate_password_hash(np), nome))
-                conn.commit(); st.success("OK!")
+            try:
+                usuarios.criar_usuario(nu, np, nome)
+            except ValueError as e: st.error(str(e))
+            else: st.success("OK!")
 else:
     # --- 3. ÁREA LOGADA ---
-    with get_db() as conn:
-        empresas = conn.execute('SELECT * FROM empresas WHERE usuario_id = ?', (st.session_state.user_id,)).fetchall()
+    empresas = usuarios.empresas_do_usuario(st.session_state.user_id)
     
     if not empresas:
         with st.form("nova_emp"):
@@ -96,9 +127,10 @@ else:
             n, c = st.text_input("Razão Social", key="en"), st.text_input("CNPJ", key="ec")
             r = st.selectbox("Regime", ["Simples Nacional", "Lucro Presumido", "MEI"], key="er")
             if st.form_submit_button("Criar"):
-                with get_db() as conn:
-                    conn.execute('INSERT INTO empresas (nome, cnpj, regime, usuario_id) VALUES (?,?,?,?)', (n, c, r, st.session_state.user_id))
-                    conn.commit(); st.rerun()
+                try:
+                    usuarios.criar_empresa(st.session_state.user_id, n, c, r)
+                except ValueError as e: st.error(str(e))
+                else: st.rerun()
         st.stop()
 
     emp_dict = {e['id']: e['nome'] for e in empresas}
@@ -113,70 +145,69 @@ else:
     if menu == "⚖️ Contabilidade":
         tp, tl = st.tabs(["Plano de Contas", "Lançamentos Manuais"])
         with tp:
-            with get_db() as conn:
-                if conn.execute("SELECT count(*) FROM plano_contas WHERE empresa_id=?", (emp_id,)).fetchone()[0] == 0:
-                    if st.button("⚡ Importar Plano Padrão"): importar_plano_padrao(emp_id); st.rerun()
-            with get_db() as conn:
-                df_p = pd.read_sql_query("SELECT cod, nome, grupo FROM plano_contas WHERE empresa_id=?", conn, params=(emp_id,))
-                st.dataframe(df_p, use_container_width=True)
+            df_p = plano_de_contas(emp_id)
+            if df_p.empty:
+                if st.button("⚡ Importar Plano Padrão"):
+                    try:
+                        importar_plano_padrao(emp_id)
+                    except ValueError as e: st.error(str(e))
+                    else: st.rerun()
+            st.dataframe(df_p, use_container_width=True)
         with tl:
             st.subheader("Nova Partida Dobrada")
-            with get_db() as conn:
-                contas = [f"{r['cod']} - {r['nome']}" for r in conn.execute("SELECT cod, nome FROM plano_contas WHERE empresa_id=?", (emp_id,)).fetchall()]
+            contas = contas_da_empresa(emp_id)
             if contas:
                 with st.form("f_lanc_man"):
                     col1, col2 = st.columns(2)
                     d, v = col1.date_input("Data"), col2.number_input("Valor R$", min_value=0.01)
-                    deb, crd = st.selectbox("Conta Débito", contas, key="d_man"), st.selectbox("Conta Crédito", contas, key="c_man")
+                    deb = st.selectbox("Conta Débito", list(contas), format_func=contas.get, key="d_man")
+                    crd = st.selectbox("Conta Crédito", list(contas), format_func=contas.get, key="c_man")
                     h = st.text_area("Histórico")
                     if st.form_submit_button("Lançar"):
-                        if is_periodo_fechado(emp_id, d): st.error("Período Fechado!")
-                        elif deb == crd: st.error("Contas iguais!")
-                        else:
-                            with get_db() as conn:
-                                conn.execute("INSERT INTO lancamentos (empresa_id, data, conta_debito, conta_credito, valor, historico) VALUES (?,?,?,?,?,?)", (emp_id, str(d), deb, crd, v, h))
-                                conn.commit(); st.success("OK!"); st.rerun()
+                        try:
+                            lancar(emp_id, d, deb, crd, v, h)
+                        except ValueError as e: st.error(str(e))
+                        else: st.success("OK!"); st.rerun()
 
     # --- MÓDULO RELATÓRIOS ---
     elif menu == "📄 Relatórios":
         st.header("Relatórios Contábeis")
-        t_dre, t_bp, t_fat, t_fisc = st.tabs(["DRE", "Balanço Patrimonial", "Faturamento 12m", "Espelho Fiscal"])
-        with get_db() as conn:
-            df_l = pd.read_sql_query("SELECT * FROM lancamentos WHERE empresa_id=?", conn, params=(emp_id,))
-            df_p = pd.read_sql_query("SELECT * FROM plano_contas WHERE empresa_id=?", conn, params=(emp_id,))
-        
-        if not df_l.empty:
-            saldos = []
-            for _, c in df_p.iterrows():
-                label = f"{c['cod']} - {c['nome']}"
-                deb = df_l[df_l['conta_debito'] == label]['valor'].sum()
-                crd = df_l[df_l['conta_credito'] == label]['valor'].sum()
-                res = (deb - crd) if c['grupo'] in ['Ativo', 'Despesa'] else (crd - deb)
-                saldos.append({'Conta': c['nome'], 'Grupo': c['grupo'], 'Saldo': res})
-            df_s = pd.DataFrame(saldos)
+        t_dre, t_bp, t_raz, t_dia, t_fat, t_fisc = st.tabs(["DRE", "Balanço Patrimonial", "Razão", "Diário", "Faturamento 12m", "Espelho Fiscal"])
+        if tem_lancamentos(emp_id):
+            df_s = balancete(emp_id)[['nome', 'grupo', 'saldo']].rename(columns={'nome': 'Conta', 'grupo': 'Grupo', 'saldo': 'Saldo'})
 
             with t_dre:
                 dre = df_s[df_s['Grupo'].isin(['Receita', 'Despesa'])]
                 st.table(dre)
-                if st.button("PDF DRE"): st.download_button("Baixar PDF", gerar_pdf(dre, "DRE"), "dre.pdf")
+                if st.button("📄 Gerar PDF DRE", key="pdf_dre"): enfileirar_pdf(emp_id, 'dre')
             with t_bp:
                 st.write("**Ativo**")
                 st.table(df_s[df_s['Grupo'] == 'Ativo'])
                 st.write("**Passivo/PL**")
                 st.table(df_s[df_s['Grupo'].isin(['Passivo', 'Patrimônio Líquido'])])
+                if st.button("📄 Gerar PDF Balanço", key="pdf_bp"): enfileirar_pdf(emp_id, 'balanco')
+            with t_raz:
+                c1, c2, c3 = st.columns(3)
+                r_ini = c1.date_input("De", value=None, key="raz_ini")
+                r_fim = c2.date_input("Até", value=None, key="raz_fim")
+                contas = contas_da_empresa(emp_id)
+                r_conta = c3.selectbox("Conta", [None] + list(contas), format_func=lambda c: "(todas)" if c is None else contas[c], key="raz_conta")
+                if st.button("📄 Gerar PDF Razão", key="pdf_raz"): enfileirar_pdf(emp_id, 'razao', r_ini, r_fim, r_conta)
+            with t_dia:
+                c1, c2 = st.columns(2)
+                d_ini = c1.date_input("De", value=None, key="dia_ini")
+                d_fim = c2.date_input("Até", value=None, key="dia_fim")
+                if st.button("📄 Gerar PDF Diário", key="pdf_dia"): enfileirar_pdf(emp_id, 'diario', d_ini, d_fim)
             with t_fat:
-                df_l['data'] = pd.to_datetime(df_l['data'])
-                fat = df_l[df_l['conta_credito'].str.contains("Receita")].groupby(df_l['data'].dt.strftime('%m/%Y'))['valor'].sum()
-                st.bar_chart(fat)
+                st.bar_chart(faturamento_12m(emp_id))
+            painel_tarefas(['pdf'])
         else: st.info("Sem dados.")
 
     # --- DASHBOARD ---
     elif menu == "📊 Dashboard":
         st.title(f"Painel de Controle - {emp_dict[emp_id]}")
-        with get_db() as conn:
-            # Cálculo de Receitas (Grupo 4) e Despesas (Grupo 5)
-            rec = conn.execute("SELECT sum(valor) FROM lancamentos WHERE empresa_id=? AND conta_credito LIKE '4%'", (emp_id,)).fetchone()[0] or 0
-            des = conn.execute("SELECT sum(valor) FROM lancamentos WHERE empresa_id=? AND conta_debito LIKE '5%'", (emp_id,)).fetchone()[0] or 0
+        # Cálculo de Receitas (Grupo 4) e Despesas (Grupo 5)
+        rec, des = metricas_dashboard(emp_id)
         
         c1, c2, c3 = st.columns(3)
         c1.metric("Faturamento Mensal", f"R$ {rec:,.2f}")
@@ -184,84 +215,77 @@ else:
         c3.metric("Lucro Líquido", f"R$ {rec - des:,.2f}", delta=float(rec - des))
 
         st.divider()
-        with get_db() as conn:
-            # Correção: Uso de params para evitar DatabaseError
-            df_hist = pd.read_sql_query("SELECT data, valor FROM lancamentos WHERE empresa_id=?", conn, params=(emp_id,))
+        hist = evolucao_diaria(emp_id)
         
-        if not df_hist.empty:
-            df_hist['data'] = pd.to_datetime(df_hist['data'])
+        if not hist.empty:
             st.subheader("Evolução Financeira (Lançamentos)")
-            st.line_chart(df_hist.groupby('data')['valor'].sum())
+            st.line_chart(hist)
         else:
             st.info("Aguardando lançamentos para gerar gráficos.")
 
     elif menu == "🏦 Fiscal":
-        with get_db() as conn:
-            empresa_atual = conn.execute("SELECT regime FROM empresas WHERE id = ?", (emp_id,)).fetchone()
-            regime = empresa_atual['regime']
+        t_emp, t_cart = st.tabs(["Empresa Ativa", "Carteira"])
 
-        st.header(f"Apuração Fiscal - {regime}")
-        
-        c1, c2 = st.columns(2)
-        mes_f = c1.selectbox("Mês", [f"{i:02d}" for i in range(1, 13)], key="fisc_m")
-        ano_f = c1.selectbox("Ano", ["2025", "2026"], key="fisc_a")
-        
-        data_ini, data_fim = f"{ano_f}-{mes_f}-01", f"{ano_f}-{mes_f}-31"
-
-        with get_db() as conn:
-            # Soma faturamento (Contas que começam com '4')
-            query = "SELECT sum(valor) FROM lancamentos WHERE empresa_id=? AND conta_credito LIKE '4%' AND data BETWEEN ? AND ?"
-            faturamento = conn.execute(query, (emp_id, data_ini, data_fim)).fetchone()[0] or 0
-
-        st.metric("Faturamento Bruto", f"R$ {faturamento:,.2f}")
-
-        imposto_total = 0
-        detalhes = {}
-
-        if regime == "MEI":
-            st.info("O MEI possui guia fixa (DAS).")
-            tipo_atv = st.radio("Atividade", ["Comércio/Indústria", "Serviços", "Ambos"], key="atv_mei")
-            # Valores de referência aproximados
-            imposto_total = 71.60 if tipo_atv == "Comércio/Indústria" else 75.60 if tipo_atv == "Serviços" else 76.60
-            detalhes = {"DAS MEI": imposto_total}
-
-        elif regime == "Simples Nacional":
-            aliq = st.number_input("Alíquota Efetiva (%)", value=6.0, step=0.1, key="sn_aliq_val")
-            imposto_total = faturamento * (aliq / 100)
-            detalhes = {"DAS Simples Nacional": imposto_total}
-
-        elif regime == "Lucro Presumido":
-            st.subheader("Cálculo de Impostos Federais")
-            tipo_lp = st.selectbox("Atividade", ["Serviços (32%)", "Comércio (8%)"], key="lp_tipo")
-            presuncao = 0.32 if "Serviços" in tipo_lp else 0.08
+        with t_emp:
+            regime = emp_regime[emp_id]
+            st.header(f"Apuração Fiscal - {regime}")
             
-            # Alíquotas padrão Lucro Presumido
-            pis = faturamento * 0.0065
-            cofins = faturamento * 0.03
-            irpj = (faturamento * presuncao) * 0.15
-            csll = (faturamento * (0.32 if "Serviços" in tipo_lp else 0.12)) * 0.09
+            c1, c2 = st.columns(2)
+            mes_f = c1.selectbox("Mês", [f"{i:02d}" for i in range(1, 13)], key="fisc_m")
+            ano_f = c1.selectbox("Ano", ["2025", "2026"], key="fisc_a")
+            parametros = {}
+
+            if regime == "MEI":
+                st.info("O MEI possui guia fixa (DAS).")
+                parametros['atividade_mei'] = st.radio("Atividade", list(fiscal.DAS_MEI), key="atv_mei")
+            elif regime == "Simples Nacional":
+                parametros['aliquota_simples'] = st.number_input("Alíquota Efetiva (%)", value=6.0, step=0.1, key="sn_aliq_val")
+            elif regime == "Lucro Presumido":
+                st.subheader("Cálculo de Impostos Federais")
+                parametros['atividade_lp'] = st.selectbox("Atividade", list(fiscal.PRESUNCAO_LP), format_func=lambda a: f"{a} ({fiscal.PRESUNCAO_LP[a][0]:.0%})", key="lp_tipo")
+
+            df_ap = fiscal.apurar([emp_id], f"{ano_f}-{mes_f}", f"{ano_f}-{mes_f}", **parametros)
+            faturamento = df_ap['faturamento'].iloc[0] if not df_ap.empty else 0
+            imposto_total = df_ap['valor'].sum()
+            st.metric("Faturamento Bruto", f"R$ {faturamento:,.2f}")
+
+            st.divider()
+            for imp, val in zip(df_ap['imposto'], df_ap['valor']):
+                st.write(f"**{imp}:** R$ {val:,.2f}")
             
-            imposto_total = pis + cofins + irpj + csll
-            detalhes = {"PIS": pis, "COFINS": cofins, "IRPJ": irpj, "CSLL": csll}
+            st.subheader(f"Total de Impostos: R$ {imposto_total:,.2f}")
 
-        st.divider()
-        for imp, val in detalhes.items():
-            st.write(f"**{imp}:** R$ {val:,.2f}")
-        
-        st.subheader(f"Total de Impostos: R$ {imposto_total:,.2f}")
-
-        if st.button("Gerar Provisão de Impostos", type="primary", key="btn_prov_fisc"):
-            if is_periodo_fechado(emp_id, data_ini):
-                st.error("Período fechado! Não é possível lançar.")
-            elif imposto_total > 0:
-                with get_db() as conn:
-                    for imp, val in detalhes.items():
-                        conn.execute("""
-                            INSERT INTO lancamentos (empresa_id, data, conta_debito, conta_credito, valor, historico) 
-                            VALUES (?,?,?,?,?,?)
-                        """, (emp_id, data_fim, "5.01.04 - Provisão de Impostos", "2.01.03 - Impostos a Recolher", val, f"Provisão {imp} ref {mes_f}/{ano_f}"))
-                    conn.commit()
-                st.success("Impostos provisionados com sucesso!")
+            if st.button("Gerar Provisão de Impostos", type="primary", key="btn_prov_fisc"):
+                if is_periodo_fechado(emp_id, f"{ano_f}-{mes_f}"):
+                    st.error("Período fechado! Não é possível lançar.")
+                elif imposto_total > 0:
+                    enfileirar(emp_id, 'provisionar', {'empresas': [emp_id], 'de': f"{ano_f}-{mes_f}", 'ate': f"{ano_f}-{mes_f}", 'opcoes': parametros})
+
+        with t_cart:
+            st.header("Apuração da Carteira")
+            meses = pd.period_range("2024-01", "2026-12", freq='M').strftime('%Y-%m').tolist()
+            c1, c2, c3 = st.columns(3)
+            de = c1.selectbox("De", meses, index=len(meses) - 12, key="cart_de")
+            ate = c1.selectbox("Até", meses, index=len(meses) - 1, key="cart_ate")
+            atv_mei = c2.selectbox("Atividade MEI", list(fiscal.DAS_MEI), key="cart_mei")
+            aliq_sn = c2.number_input("Alíquota Simples (%)", value=6.0, step=0.1, key="cart_sn")
+            atv_lp = c3.selectbox("Atividade Lucro Presumido", list(fiscal.PRESUNCAO_LP), key="cart_lp")
+
+            if de > ate:
+                st.error("O mês inicial deve ser anterior ao final.")
+            else:
+                df_cart = fiscal.apurar(list(emp_dict), de, ate, atv_mei, aliq_sn, atv_lp)
+                st.dataframe(df_cart.pivot_table(index='nome', columns='mes', values='valor', aggfunc='sum', fill_value=0),
+                             use_container_width=True)
+                with st.expander("Detalhe por tributo"):
+                    st.dataframe(df_cart, use_container_width=True, hide_index=True)
+                st.subheader(f"Total da Carteira: R$ {df_cart['valor'].sum():,.2f}")
+
+                if st.button("Provisionar Carteira", type="primary", key="btn_prov_cart"):
+                    enfileirar(emp_id, 'provisionar', {'empresas': list(emp_dict), 'de': de, 'ate': ate,
+                                                       'opcoes': {'atividade_mei': atv_mei, 'aliquota_simples': aliq_sn, 'atividade_lp': atv_lp}})
+
+        painel_tarefas(['provisionar'])
     
     elif menu == "📥 Importar":
         st.header("Importação de Movimentações")
@@ -271,81 +295,82 @@ else:
             st.write("Modelo de colunas: `data`, `conta_debito`, `conta_credito`, `valor`, `historico`")
             file_csv = st.file_uploader("Selecione o CSV", type="csv", key="up_csv_f")
             if file_csv:
-                df_csv = pd.read_csv(file_csv)
-                st.dataframe(df_csv.head())
+                st.dataframe(pd.read_csv(file_csv, nrows=5))
                 if st.button("Processar Lançamentos CSV", key="btn_proc_csv"):
-                    with get_db() as conn:
-                        for _, r in df_csv.iterrows():
-                            if not is_periodo_fechado(emp_id, r['data']):
-                                conn.execute("INSERT INTO lancamentos (empresa_id, data, conta_debito, conta_credito, valor, historico) VALUES (?,?,?,?,?,?)", 
-                                           (emp_id, str(r['data']), r['conta_debito'], r['conta_credito'], float(r['valor']), r['historico']))
-                        conn.commit()
-                    st.success("Importação concluída!")
+                    enfileirar(emp_id, 'importar_csv', entrada=file_csv.getvalue())
 
         with t_ofx:
-            file_ofx = st.file_uploader("Selecione o arquivo OFX", type="ofx", key="up_ofx_f")
-            with get_db() as conn:
-                # Busca contas de banco para contrapartida
-                bancos = [f"{r['cod']} - {r['nome']}" for r in conn.execute("SELECT cod, nome FROM plano_contas WHERE empresa_id=? AND nome LIKE '%Banco%'", (emp_id,)).fetchall()]
-            
-            c_banco = st.selectbox("Selecione a conta Banco do Plano", bancos, key="sel_banco_ofx")
+            files_ofx = st.file_uploader("Selecione os arquivos OFX", type="ofx", accept_multiple_files=True, key="up_ofx_f")
+            # Busca contas de banco para contrapartida
+            bancos = contas_da_empresa(emp_id, "Banco")
+            c_banco = st.selectbox("Selecione a conta Banco do Plano", list(bancos), format_func=bancos.get, key="sel_banco_ofx")
             
-            if file_ofx and c_banco:
-                from ofxtools.Parser import OFXTree
-                parser = OFXTree()
-                parser.parse(file_ofx)
-                ofx = parser.convert()
-                
-                trans = []
-                for stmt in ofx.statements:
-                    for tr in stmt.banktranlist:
-                        trans.append({'data': tr.dtposted.date(), 'valor': float(tr.trnamt), 'memo': tr.memo or tr.name})
-                
-                df_ofx = pd.DataFrame(trans)
-                st.dataframe(df_ofx)
+            if files_ofx and c_banco:
+                df_ofx = ler_extratos(tuple((f.name, f.getvalue()) for f in files_ofx))
+                st.dataframe(df_ofx, hide_index=True)
                 
                 if st.button("Lançar Extrato", key="btn_proc_ofx"):
-                    with get_db() as conn:
-                        for _, t in df_ofx.iterrows():
-                            if is_periodo_fechado(emp_id, t['data']): continue
-                            # Lógica de débito/crédito automática baseada no sinal do valor
-                            deb = c_banco if t['valor'] > 0 else "2.09.99 - A Classificar (Saídas)"
-                            crd = c_banco if t['valor'] < 0 else "1.09.99 - A Classificar (Entradas)"
-                            conn.execute("INSERT INTO lancamentos (empresa_id, data, conta_debito, conta_credito, valor, historico) VALUES (?,?,?,?,?,?)", 
-                                       (emp_id, str(t['data']), deb, crd, abs(t['valor']), t['memo']))
-                        conn.commit()
-                    st.success("Extrato processado com contas de classificação automática.")
+                    enfileirar(emp_id, 'importar_ofx', {'conta_banco_id': c_banco}, df_ofx.to_json(orient='split', index=False).encode())
+
+        painel_tarefas(['importar_csv', 'importar_ofx'])
                     
     # --- GERENCIAR ---
     elif menu == "⚙️ Gerenciar":
         st.header("Histórico e Manutenção de Dados")
         st.write("Visualize ou remova lançamentos específicos abaixo.")
         
-        with get_db() as conn:
-            # Seleção protegida por params
-            df_g = pd.read_sql_query("SELECT id, data, conta_debito, conta_credito, valor, historico FROM lancamentos WHERE empresa_id=?", conn, params=(emp_id,))
-        
-        if not df_g.empty:
+        contas = contas_da_empresa(emp_id)
+        with st.expander("🔎 Filtros", expanded=False):
+            f1, f2, f3 = st.columns(3)
+            periodo = f1.date_input("Período", value=(), key="ger_periodo")
+            conta_f = f2.selectbox("Conta", [None] + list(contas), format_func=lambda x: "Todas" if x is None else contas[x], key="ger_conta")
+            busca = f3.text_input("Buscar no histórico", key="ger_busca")
+            v1, v2 = st.columns(2)
+            v_min = v1.number_input("Valor mínimo", value=None, min_value=0.0, key="ger_vmin")
+            v_max = v2.number_input("Valor máximo", value=None, min_value=0.0, key="ger_vmax")
+        filtros = dict(data_ini=periodo[0] if len(periodo) > 0 else None, data_fim=periodo[1] if len(periodo) > 1 else None,
+                       conta_id=conta_f, valor_min=v_min, valor_max=v_max, busca=busca)
+
+        # Pilha com a chave inicial de cada página visitada; volta ao início quando os filtros mudam
+        if st.session_state.get('ger_filtros') != (emp_id, filtros):
+            st.session_state.update({'ger_filtros': (emp_id, filtros), 'ger_paginas': [None]})
+        paginas = st.session_state['ger_paginas']
+        df_g, proxima = listar_lancamentos(emp_id, apos=paginas[-1], **filtros)
+
+        if not df_g.empty or len(paginas) > 1:
             st.dataframe(df_g, use_container_width=True, hide_index=True)
+            p1, p2, p3 = st.columns([1, 1, 4])
+            if p1.button("◀ Anterior", disabled=len(paginas) == 1, key="btn_pag_ant"):
+                paginas.pop(); st.rerun()
+            if p2.button("Próxima ▶", disabled=proxima is None, key="btn_pag_prox"):
+                paginas.append(proxima); st.rerun()
+            p3.caption(f"Página {len(paginas)}")
             
             st.subheader("Excluir Registro")
-            id_del = st.number_input("Informe o ID do lançamento:", min_value=int(df_g['id'].min()), key="input_del_id")
+            id_del = st.number_input("Informe o ID do lançamento:", min_value=1, key="input_del_id")
             
             if st.button("❌ Confirmar Exclusão", type="primary", key="btn_del_exec"):
-                # Busca a data do lançamento para validar se o período está fechado
-                data_lanc = df_g[df_g['id'] == id_del]['data'].values[0]
-                
-                if is_periodo_fechado(emp_id, data_lanc):
-                    st.error("Não é possível excluir: Este período contábil já foi encerrado.")
+                try:
+                    excluir_lancamento(emp_id, id_del)
+                except ValueError as e: st.error(str(e))
                 else:
-                    with get_db() as conn:
-                        conn.execute("DELETE FROM lancamentos WHERE id=? AND empresa_id=?", (id_del, emp_id))
-                        conn.commit()
                     st.success(f"Lançamento {id_del} removido com sucesso!")
                     st.rerun()
         else:
             st.info("Nenhum dado encontrado para esta empresa.")
 
+        with st.expander("Saldos Mensais (materializados)"):
+            cv, cr = st.columns(2)
+            if cv.button("🔎 Verificar Saldos", key="btn_verif_saldos"):
+                df_div = verificar_saldos(emp_id)
+                if df_div.empty: st.success("Saldos mensais conferem com os lançamentos.")
+                else: st.error(f"{len(df_div)} divergência(s) encontrada(s)."); st.dataframe(df_div, use_container_width=True)
+            if cr.button("🔁 Reconstruir Saldos", key="btn_rec_saldos"):
+                try:
+                    reconstruir_saldos(emp_id)
+                except ValueError as e: st.error(str(e))
+                else: st.success("Saldos mensais reconstruídos.")
+
     # --- FECHAMENTO ---
     elif menu == "🔒 Fechamento":
         st.header("Encerramento de Período Contábil")
@@ -361,31 +386,33 @@ else:
                 
                 if st.form_submit_button("🔒 Bloquear Período"):
                     try:
-                        with get_db() as conn:
-                            conn.execute("INSERT INTO fechamentos (empresa_id, mes_ano) VALUES (?,?)", (emp_id, f"{a_lock}-{m_lock}"))
-                            conn.commit()
+                        periodos.fechar_periodo(emp_id, f"{a_lock}-{m_lock}")
                         st.success(f"Período {m_lock}/{a_lock} trancado!")
                         st.rerun()
                     except sqlite3.IntegrityError:
                         st.error("Este período já consta como fechado no sistema.")
+                    except ValueError as e: st.error(str(e))
 
         with col_f2:
             st.subheader("Meses Bloqueados")
-            with get_db() as conn:
-                df_fechados = pd.read_sql_query("SELECT id, mes_ano FROM fechamentos WHERE empresa_id=?", conn, params=(emp_id,))
+            df_fechados = periodos.listar_fechamentos(emp_id)
             
             if not df_fechados.empty:
                 st.table(df_fechados)
                 id_abrir = st.number_input("ID para reabertura:", min_value=int(df_fechados['id'].min()), key="id_reabertura")
                 if st.button("🔓 Reabrir Período", key="btn_reabrir"):
-                    with get_db() as conn:
-                        conn.execute("DELETE FROM fechamentos WHERE id=? AND empresa_id=?", (id_abrir, emp_id))
-                        conn.commit()
-                    st.success("Período reaberto para lançamentos.")
-                    st.rerun()
+                    try:
+                        periodos.reabrir_periodo(emp_id, id_abrir)
+                    except ValueError as e: st.error(str(e))
+                    else:
+                        st.success("Período reaberto para lançamentos.")
+                        st.rerun()
             else:
                 st.info("Todos os períodos estão abertos.")
 
 # --- RODAPÉ ---
 st.sidebar.markdown("---")
-st.sidebar.caption("SaaS Contábil v5.0 | 2026")
\ No newline at end of file
+st.sidebar.caption("SaaS Contábil v5.0 | 2026")
+stats, stats_cache = db.estatisticas(), cache.estatisticas()
+st.sidebar.caption(f"{stats['consultas_rodada']} consultas nesta execução · {stats['conexoes_abertas']} conexões abertas · {stats['retentativas']} retentativas")
+st.sidebar.caption(f"Cache: {stats_cache['acertos']} acertos · {stats_cache['faltas']} faltas · {stats_cache['itens']} itens")
\ No newline at end of file
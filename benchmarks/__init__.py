@@ -0,0 +1 @@
+"""Benchmarks dos caminhos quentes do SysContábil; ver `python -m benchmarks --help`."""
@@ -0,0 +1,96 @@
+"""Executa os benchmarks, grava o resultado em JSON e compara com uma execução de referência.
+
+Uso (na raiz do repositório):
+    python -m benchmarks --saida atual.json [--comparar referencia.json] [--cenarios balancete,gerenciar]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from . import gerador
+from .cenarios import cenarios, executar
+
+def _comparar(atual, referencia, tolerancia):
+    """Tabela de p50 atual contra a referência; devolve os cenários que pioraram além da tolerância."""
+    linhas, piores = [], []
+    for nome, med in atual['cenarios'].items():
+        ref = referencia['cenarios'].get(nome)
+        if not ref:
+            continue
+        razao = med['p50_ms'] / ref['p50_ms'] if ref['p50_ms'] else float('inf')
+        situacao = "PIOROU" if razao > 1 + tolerancia else "melhorou" if razao < 1 - tolerancia else ""
+        if situacao == "PIOROU":
+            piores.append(nome)
+        linhas.append((nome, ref['p50_ms'], med['p50_ms'], f"{(razao - 1):+.1%}", situacao))
+    print(pd.DataFrame(linhas, columns=['cenário', 'ref p50 ms', 'atual p50 ms', 'variação', '']).to_string(index=False))
+    return piores
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmarks do SysContábil sobre massa sintética determinística.")
+    ap.add_argument("--usuarios", type=int, default=2)
+    ap.add_argument("--empresas", type=int, default=2, help="Empresas por usuário")
+    ap.add_argument("--contas", type=int, default=100, help="Contas no plano de cada empresa")
+    ap.add_argument("--lancamentos", type=int, default=100000, help="Lançamentos por empresa")
+    ap.add_argument("--anos", type=int, default=3)
+    ap.add_argument("--meses-fechados", type=int, default=12)
+    ap.add_argument("--semente", type=int, default=42)
+    ap.add_argument("--linhas-csv", default="100000,1000000", help="Tamanhos de CSV a importar, separados por vírgula")
+    ap.add_argument("--transacoes-ofx", type=int, default=5000)
+    ap.add_argument("--repeticoes", type=int, default=5, help="Repetições dos cenários de leitura")
+    ap.add_argument("--repeticoes-escrita", type=int, default=1, help="Repetições de importações e PDF")
+    ap.add_argument("--cenarios", help="Roda só os cenários cujo nome começa com um destes prefixos")
+    ap.add_argument("--banco", default=os.path.join(tempfile.gettempdir(), "syscontabil_bench.db"))
+    ap.add_argument("--saida", default="benchmark.json")
+    ap.add_argument("--comparar", help="JSON de uma execução anterior usada como referência")
+    ap.add_argument("--tolerancia", type=float, default=0.2, help="Piora relativa do p50 aceita antes de falhar")
+    args = ap.parse_args(argv)
+
+    inicio = time.perf_counter()
+    massa = gerador.gerar(args.banco, args.usuarios, args.empresas, args.contas, args.lancamentos, args.anos, args.meses_fechados, args.semente)
+    print(f"Massa gerada em {time.perf_counter() - inicio:.1f}s: {len(massa['empresas'])} empresa(s) x {args.lancamentos} lançamentos")
+    ctx = dict(massa, linhas_csv=[int(n) for n in args.linhas_csv.split(",") if n], transacoes_ofx=args.transacoes_ofx,
+               repeticoes=args.repeticoes, repeticoes_escrita=args.repeticoes_escrita)
+
+    nomes = cenarios(ctx)
+    if args.cenarios:
+        nomes = [n for n in nomes if n.startswith(tuple(args.cenarios.split(",")))]
+    resultado = {
+        'gerado_em': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'ambiente': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version, 'pandas': pd.__version__,
+                     'plataforma': platform.platform(), 'cpus': os.cpu_count()},
+        'massa': {k: v for k, v in massa.items() if k != 'caminho'},
+        'cenarios': {},
+    }
+    for nome in nomes:
+        # Um processo novo por cenário isola o pico de memória e o cache em memória de cada um
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            try:
+                med = pool.submit(executar, nome, ctx).result()
+            except ImportError as e:
+                print(f"{nome:<28} pulado: {e}")
+                continue
+        resultado['cenarios'][nome] = med
+        print(f"{nome:<28} p50 {med['p50_ms']:>10.1f} ms  p95 {med['p95_ms']:>10.1f} ms  "
+              f"{med['vazao_por_s'] or 0:>12,.0f} itens/s  pico {med['pico_rss_mb']} MB")
+
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, ensure_ascii=False, indent=2)
+    print(f"Resultado gravado em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            piores = _comparar(resultado, json.load(f), args.tolerancia)
+        if piores:
+            print(f"{len(piores)} cenário(s) acima da tolerância de {args.tolerancia:.0%}: {', '.join(piores)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
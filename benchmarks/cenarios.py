@@ -0,0 +1,186 @@
+"""Cenários de benchmark: o caminho quente de cada página do app, medido sobre a massa do gerador.
+
+Cada cenário recebe o contexto da execução e devolve (tempos_em_segundos, itens_por_repetição).
+Os que escrevem no banco usam uma empresa descartável, criada no próprio cenário, para não
+alterar os números dos demais.
+"""
+import os
+import tempfile
+import time
+import numpy as np
+from syscontabil import cache, db
+from syscontabil.contas import importar_plano_padrao, conta_por_codigo
+from syscontabil.db import transacao
+from syscontabil.importacao import importar_csv, importar_ofx
+from syscontabil.lancamentos import listar_lancamentos
+from syscontabil.periodos import is_periodo_fechado, mascara_periodo_fechado
+from syscontabil.relatorios import balancete, faturamento_12m, metricas_dashboard, evolucao_diaria, diario
+from . import gerador
+
+def _medir(fn, repeticoes, preparar=None):
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar: preparar()
+        inicio = time.perf_counter()
+        fn()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+def _empresa_descartavel(nome):
+    with transacao() as conn:
+        emp_id = conn.execute("INSERT INTO empresas (nome, regime, usuario_id) VALUES (?, 'Simples Nacional', 1)", (nome,)).lastrowid
+    importar_plano_padrao(emp_id)
+    return emp_id
+
+# --- Relatórios e Dashboard (sem cache: cada repetição recalcula) ---
+def balancete_completo(ctx):
+    emp = ctx['empresas'][0]
+    return _medir(lambda: balancete(emp), ctx['repeticoes'], cache.limpar), ctx['lancamentos']
+
+def balancete_periodo(ctx):
+    # Datas fora da virada do mês obrigam a leitura dos lançamentos brutos
+    emp, ano = ctx['empresas'][0], gerador.ANO_FINAL
+    return _medir(lambda: balancete(emp, f"{ano}-03-10", f"{ano}-09-20"), ctx['repeticoes'], cache.limpar), ctx['lancamentos']
+
+def dre(ctx):
+    emp = ctx['empresas'][0]
+    def calcular():
+        df = balancete(emp)
+        return df[df['grupo'].isin(['Receita', 'Despesa'])]
+    return _medir(calcular, ctx['repeticoes'], cache.limpar), ctx['lancamentos']
+
+def faturamento_12_meses(ctx):
+    emp = ctx['empresas'][0]
+    return _medir(lambda: faturamento_12m(emp), ctx['repeticoes'], cache.limpar), ctx['lancamentos']
+
+def dashboard_metricas(ctx):
+    emp = ctx['empresas'][0]
+    return _medir(lambda: metricas_dashboard(emp), ctx['repeticoes'], cache.limpar), ctx['lancamentos']
+
+def dashboard_evolucao(ctx):
+    emp = ctx['empresas'][0]
+    return _medir(lambda: evolucao_diaria(emp), ctx['repeticoes'], cache.limpar), ctx['lancamentos']
+
+def dashboard_em_cache(ctx):
+    emp = ctx['empresas'][0]
+    metricas_dashboard(emp), evolucao_diaria(emp)
+    return _medir(lambda: (metricas_dashboard(emp), evolucao_diaria(emp)), ctx['repeticoes']), 1
+
+# --- Gerenciar ---
+def gerenciar_primeira_pagina(ctx):
+    emp = ctx['empresas'][0]
+    return _medir(lambda: listar_lancamentos(emp), ctx['repeticoes']), 50
+
+def gerenciar_paginacao(ctx):
+    emp, paginas = ctx['empresas'][0], 20
+    def navegar():
+        chave = None
+        for _ in range(paginas):
+            _, chave = listar_lancamentos(emp, apos=chave)
+    return _medir(navegar, ctx['repeticoes']), paginas * 50
+
+def gerenciar_filtros(ctx):
+    emp = ctx['empresas'][0]
+    with transacao() as conn:
+        conta = conn.execute("SELECT conta_debito_id FROM lancamentos WHERE empresa_id=? LIMIT 1", (emp,)).fetchone()[0]
+    return _medir(lambda: listar_lancamentos(emp, conta_id=conta, valor_min=100.0, data_ini=f"{gerador.ANO_FINAL}-01-01"), ctx['repeticoes']), 50
+
+def gerenciar_busca(ctx):
+    emp = ctx['empresas'][0]
+    return _medir(lambda: listar_lancamentos(emp, busca="aluguel"), ctx['repeticoes']), 50
+
+# --- Fechamento ---
+def periodo_fechado_laco(ctx, chamadas=100000):
+    emp = ctx['empresas'][0]
+    datas = gerador.gerar_datas(np.random.default_rng(3), chamadas, ctx['anos']).tolist()
+    return _medir(lambda: [is_periodo_fechado(emp, d) for d in datas], ctx['repeticoes']), chamadas
+
+def periodo_fechado_vetorizado(ctx, linhas=1000000):
+    emp = ctx['empresas'][0]
+    datas = gerador.gerar_datas(np.random.default_rng(3), linhas, ctx['anos'])
+    return _medir(lambda: mascara_periodo_fechado(emp, datas), ctx['repeticoes']), linhas
+
+# --- PDF ---
+def pdf_diario(ctx):
+    from syscontabil.relatorio_pdf import gerar_pdf
+    emp = ctx['empresas'][0]
+    destino = os.path.join(tempfile.gettempdir(), f"bench_diario_{os.getpid()}.pdf")
+    try:
+        return _medir(lambda: gerar_pdf(diario(emp), "Livro Diário", destino), ctx['repeticoes_escrita']), ctx['lancamentos']
+    finally:
+        if os.path.exists(destino): os.remove(destino)
+
+# --- Importação (escreve no banco) ---
+def _importar_csv(ctx, linhas):
+    emp = _empresa_descartavel(f"bench csv {linhas}")
+    arquivo = gerador.gerar_csv(emp, linhas)
+    return _medir(lambda: importar_csv(emp, arquivo), ctx['repeticoes_escrita'], lambda: arquivo.seek(0)), linhas
+
+def ler_ofx(ctx):
+    from syscontabil.leitor_ofx import ler_ofx_lote
+    n = ctx['transacoes_ofx']
+    arquivo = gerador.gerar_ofx(n)
+    return _medir(lambda: ler_ofx_lote([("bench.ofx", arquivo)]), ctx['repeticoes_escrita']), n
+
+def importar_extrato_ofx(ctx):
+    from syscontabil.leitor_ofx import ler_ofx_lote
+    emp = _empresa_descartavel("bench ofx")
+    banco = conta_por_codigo(emp, "1.01.02")
+    df = ler_ofx_lote([("bench.ofx", gerador.gerar_ofx(ctx['transacoes_ofx']))])
+    # Da segunda repetição em diante todas as transações caem no anti-join de FITID repetido
+    return _medir(lambda: importar_ofx(emp, df, banco), ctx['repeticoes_escrita']), len(df)
+
+CENARIOS = {
+    'balancete': balancete_completo,
+    'balancete_periodo': balancete_periodo,
+    'dre': dre,
+    'faturamento_12m': faturamento_12_meses,
+    'dashboard_metricas': dashboard_metricas,
+    'dashboard_evolucao': dashboard_evolucao,
+    'dashboard_em_cache': dashboard_em_cache,
+    'gerenciar_primeira_pagina': gerenciar_primeira_pagina,
+    'gerenciar_paginacao': gerenciar_paginacao,
+    'gerenciar_filtros': gerenciar_filtros,
+    'gerenciar_busca': gerenciar_busca,
+    'periodo_fechado_laco': periodo_fechado_laco,
+    'periodo_fechado_vetorizado': periodo_fechado_vetorizado,
+    'pdf_diario': pdf_diario,
+    'ler_ofx': ler_ofx,
+    'importar_ofx': importar_extrato_ofx,
+}
+
+def cenarios(ctx):
+    """Nomes na ordem de execução; os que escrevem no banco ficam por último."""
+    nomes = list(CENARIOS)
+    nomes += [f"importar_csv_{n}" for n in ctx['linhas_csv']]
+    return nomes
+
+def _pico_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KiB; macOS, em bytes
+    return round(pico / (1024 * 1024 if os.uname().sysname == 'Darwin' else 1024), 1)
+
+def executar(nome, ctx):
+    """Roda um cenário (num processo próprio, para que o pico de memória seja só dele) e resume as medidas."""
+    db.DB_NAME = ctx['caminho']
+    db.fechar()
+    rss_inicial = _pico_rss_mb()
+    if nome.startswith("importar_csv_"):
+        tempos, itens = _importar_csv(ctx, int(nome.rsplit("_", 1)[1]))
+    else:
+        tempos, itens = CENARIOS[nome](ctx)
+    mediana = float(np.percentile(tempos, 50))
+    return {
+        'repeticoes': len(tempos),
+        'itens': itens,
+        'p50_ms': round(mediana * 1000, 3),
+        'p95_ms': round(float(np.percentile(tempos, 95)) * 1000, 3),
+        'min_ms': round(min(tempos) * 1000, 3),
+        'vazao_por_s': round(itens / mediana, 1) if mediana else None,
+        'rss_inicial_mb': rss_inicial,
+        'pico_rss_mb': _pico_rss_mb(),
+    }
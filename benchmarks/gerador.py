@@ -0,0 +1,122 @@
+"""Massa de dados sintética e determinística para os benchmarks.
+
+A mesma semente gera sempre o mesmo banco, o mesmo CSV e os mesmos extratos OFX, para que
+duas execuções (ou duas versões do código) sejam comparáveis.
+"""
+import io
+import os
+import numpy as np
+import pandas as pd
+from syscontabil import db
+from syscontabil.contas import importar_plano_padrao
+from syscontabil.db import get_db, transacao
+from syscontabil.esquema import GRUPO_POR_PREFIXO, init_db
+from syscontabil.lancamentos import saldos_em_lote, inserir_lancamentos
+
+ANO_FINAL = 2025
+LOTE_INSERCAO = 50000
+HISTORICOS = ["Venda NF", "Pagamento fornecedor", "Tarifa bancária", "Recebimento cliente", "Folha de pagamento",
+              "Aluguel", "Compra de mercadorias", "Transferência entre contas", "Energia elétrica", "Pró-labore"]
+
+def gerar_datas(rng, n, anos):
+    """n datas "YYYY-MM-DD" uniformes nos `anos` que terminam em ANO_FINAL."""
+    inicio = np.datetime64(f"{ANO_FINAL - anos + 1}-01-01")
+    dias = (np.datetime64(f"{ANO_FINAL + 1}-01-01") - inicio).astype(int)
+    return np.datetime_as_string(inicio + rng.integers(0, dias, n), unit='D')
+
+def _historicos(rng, n):
+    return pd.Series(np.array(HISTORICOS)[rng.integers(0, len(HISTORICOS), n)]) + " " + pd.Series(rng.integers(1, 100000, n)).astype(str)
+
+def _plano(conn, emp_id, contas):
+    """Completa o plano padrão com contas analíticas até somar `contas`."""
+    importar_plano_padrao(emp_id)
+    extras = max(contas - conn.execute("SELECT count(*) FROM plano_contas WHERE empresa_id=?", (emp_id,)).fetchone()[0], 0)
+    prefixos = list(GRUPO_POR_PREFIXO)
+    conn.executemany("INSERT INTO plano_contas (empresa_id, cod, nome, grupo) VALUES (?,?,?,?)",
+                     ((emp_id, f"{prefixos[i % 5]}.{10 + i // 5 // 1000:02d}.{i // 5 % 1000:03d}", f"Conta {i}", GRUPO_POR_PREFIXO[prefixos[i % 5]])
+                      for i in range(extras)))
+    conn.commit()
+    return [r[0] for r in conn.execute("SELECT id FROM plano_contas WHERE empresa_id=? ORDER BY id", (emp_id,))]
+
+def gerar(caminho, usuarios=2, empresas_por_usuario=2, contas=100, lancamentos=100000, anos=3, meses_fechados=12, semente=42):
+    """Cria do zero o banco em `caminho` e devolve a descrição da massa gerada.
+
+    Cada empresa recebe `lancamentos` lançamentos espalhados pelos `anos` e tem os primeiros
+    `meses_fechados` meses trancados.
+    """
+    from werkzeug.security import generate_password_hash
+    for sufixo in ("", "-wal", "-shm"):
+        if os.path.exists(caminho + sufixo):
+            os.remove(caminho + sufixo)
+    db.DB_NAME = caminho
+    db.fechar()
+    init_db()
+    rng = np.random.default_rng(semente)
+    conn = get_db()
+    # Um único hash para todos: o PBKDF2 do werkzeug é lento de propósito
+    senha = generate_password_hash("bench")
+    conn.executemany("INSERT INTO usuarios (username, password, nome_completo) VALUES (?,?,?)",
+                     ((f"bench{u}", senha, f"Usuário {u}") for u in range(usuarios)))
+    regimes = ["Simples Nacional", "Lucro Presumido", "MEI"]
+    for u, (uid,) in enumerate(conn.execute("SELECT id FROM usuarios ORDER BY id").fetchall()):
+        conn.executemany("INSERT INTO empresas (nome, cnpj, regime, usuario_id) VALUES (?,?,?,?)",
+                         ((f"Empresa {u}.{e}", f"{u:04d}{e:04d}000100", regimes[(u + e) % 3], uid) for e in range(empresas_por_usuario)))
+    conn.commit()
+
+    empresas = [r[0] for r in conn.execute("SELECT id FROM empresas ORDER BY id")]
+    primeiro_mes = pd.Period(f"{ANO_FINAL - anos + 1}-01", freq='M')
+    fechados = [str(primeiro_mes + i) for i in range(meses_fechados)]
+    for emp_id in empresas:
+        ids = np.array(_plano(conn, emp_id, contas))
+        conn.execute("BEGIN IMMEDIATE")
+        with saldos_em_lote(conn, emp_id):
+            for ini in range(0, lancamentos, LOTE_INSERCAO):
+                n = min(LOTE_INSERCAO, lancamentos - ini)
+                deb = rng.integers(0, len(ids), n)
+                # Deslocamento de 1 a len-1 garante contrapartida diferente da conta debitada
+                crd = (deb + rng.integers(1, len(ids), n)) % len(ids)
+                valores = np.round(rng.lognormal(5, 1.5, n), 2)
+                inserir_lancamentos(conn, emp_id, zip(gerar_datas(rng, n, anos), ids[deb].tolist(), ids[crd].tolist(), valores.tolist(), _historicos(rng, n)))
+        conn.executemany("INSERT INTO fechamentos (empresa_id, mes_ano) VALUES (?,?)", ((emp_id, m) for m in fechados))
+        conn.commit()
+    return {'caminho': caminho, 'empresas': empresas, 'usuarios': usuarios, 'contas': contas, 'lancamentos': lancamentos,
+            'anos': anos, 'meses_fechados': fechados, 'semente': semente}
+
+def gerar_csv(emp_id, linhas, anos=1, semente=7, invalidas=0.01):
+    """CSV de importação com `linhas` lançamentos nos meses abertos, com uma fração de linhas inválidas."""
+    rng = np.random.default_rng(semente)
+    with transacao() as conn:
+        rotulos = np.array([f"{r['cod']} - {r['nome']}" for r in conn.execute("SELECT cod, nome FROM plano_contas WHERE empresa_id=? ORDER BY id", (emp_id,))])
+    deb = rng.integers(0, len(rotulos), linhas)
+    crd = (deb + rng.integers(1, len(rotulos), linhas)) % len(rotulos)
+    df = pd.DataFrame({'data': gerar_datas(rng, linhas, anos), 'conta_debito': rotulos[deb], 'conta_credito': rotulos[crd],
+                       'valor': np.round(rng.lognormal(5, 1.5, linhas), 2).astype(str), 'historico': _historicos(rng, linhas)})
+    ruins = rng.random(linhas) < invalidas
+    df.loc[ruins, 'valor'] = "n/d"
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False)
+    buf.seek(0)
+    return buf
+
+def gerar_ofx(transacoes, conta="12345-6", mes=f"{ANO_FINAL}-12", semente=11):
+    """Extrato OFX 1.02 (SGML) com `transacoes` lançamentos no mês informado."""
+    rng = np.random.default_rng(semente)
+    dias = rng.integers(1, 29, transacoes)
+    valores = np.round(rng.normal(0, 500, transacoes), 2)
+    ano_mes = mes.replace("-", "")
+    linhas = "".join(f"<STMTTRN><TRNTYPE>OTHER<DTPOSTED>{ano_mes}{d:02d}120000<TRNAMT>{v}<FITID>{conta}-{i}<MEMO>Transação {i}</STMTTRN>"
+                     for i, (d, v) in enumerate(zip(dias, valores)))
+    return f"""OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+SECURITY:NONE
+ENCODING:USASCII
+CHARSET:1252
+COMPRESSION:NONE
+OLDFILEUID:NONE
+NEWFILEUID:NONE
+
+<OFX><SIGNONMSGSRSV1><SONRS><STATUS><CODE>0<SEVERITY>INFO</STATUS><DTSERVER>{ano_mes}28120000<LANGUAGE>POR</SONRS></SIGNONMSGSRSV1>
+<BANKMSGSRSV1><STMTTRNRS><TRNUID>1<STATUS><CODE>0<SEVERITY>INFO</STATUS><STMTRS><CURDEF>BRL<BANKACCTFROM><BANKID>341<ACCTID>{conta}<ACCTTYPE>CHECKING</BANKACCTFROM>
+<BANKTRANLIST><DTSTART>{ano_mes}01<DTEND>{ano_mes}28{linhas}</BANKTRANLIST><LEDGERBAL><BALAMT>0<DTASOF>{ano_mes}28</LEDGERBAL></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+""".encode('cp1252')
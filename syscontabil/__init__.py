@@ -0,0 +1,16 @@
+"""Núcleo do SysContábil, independente do Streamlit: o app.py é só uma interface sobre estes módulos.
+
+    db           conexões SQLite por thread e retentativa em banco travado
+    esquema      migrações (init_db), gatilhos, índices e views
+    usuarios     login, cadastro e empresas de cada usuário
+    contas       plano de contas
+    lancamentos  gravação, exclusão, consulta paginada e saldos mensais; CLI: python -m syscontabil.lancamentos
+    periodos     fechamento e reabertura de meses
+    importacao   CSV e extratos OFX (lidos por leitor_ofx)
+    relatorios   balancete, DRE/Balanço, razão, diário e PDFs (relatorio_pdf)
+    fiscal       apuração e provisão de impostos em lote; CLI: python -m syscontabil.fiscal
+    cache        cache de resultados pela versão dos dados da empresa
+    tarefas      fila em segundo plano para importações, provisões e PDFs
+
+Dependências pesadas e opcionais (ofxtools, fpdf, werkzeug) só são importadas nos caminhos que as usam.
+"""
@@ -0,0 +1,52 @@
+"""Cache de resultados por (empresa, versão dos dados).
+
+Gatilhos no banco incrementam `versao_dados` a cada escrita em lançamentos, plano de contas ou
+fechamentos da empresa; um resultado em cache só vale enquanto a versão não muda, então não há
+invalidação manual. As entradas antigas saem por LRU ao atingir `MAX_ITENS`.
+"""
+import functools
+import threading
+from collections import OrderedDict
+from .db import transacao
+
+MAX_ITENS = 256
+
+_itens = OrderedDict()
+_lock = threading.Lock()
+_stats = {'acertos': 0, 'faltas': 0, 'descartes': 0}
+
+def versao_dados(emp_id):
+    with transacao() as conn:
+        row = conn.execute("SELECT versao FROM versao_dados WHERE empresa_id=?", (emp_id,)).fetchone()
+    return row['versao'] if row else 0
+
+def versionado(func):
+    """Guarda o resultado de `func(emp_id, ...)` até a próxima escrita nos dados da empresa.
+
+    O valor devolvido é compartilhado entre chamadas e sessões: não deve ser alterado pelo chamador.
+    """
+    @functools.wraps(func)
+    def wrapper(emp_id, *args, **kwargs):
+        chave = (func.__qualname__, emp_id, versao_dados(emp_id), args, tuple(sorted(kwargs.items())))
+        with _lock:
+            if chave in _itens:
+                _itens.move_to_end(chave)
+                _stats['acertos'] += 1
+                return _itens[chave]
+            _stats['faltas'] += 1
+        valor = func(emp_id, *args, **kwargs)
+        with _lock:
+            _itens[chave] = valor
+            while len(_itens) > MAX_ITENS:
+                _itens.popitem(last=False)
+                _stats['descartes'] += 1
+        return valor
+    return wrapper
+
+def limpar():
+    with _lock:
+        _itens.clear()
+
+def estatisticas():
+    with _lock:
+        return dict(_stats, itens=len(_itens))
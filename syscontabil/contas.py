@@ -0,0 +1,40 @@
+"""Plano de contas das empresas."""
+import pandas as pd
+from .db import transacao, com_retentativa
+
+def plano_de_contas(emp_id):
+    with transacao() as conn:
+        return pd.read_sql_query("SELECT cod, nome, grupo FROM plano_contas WHERE empresa_id=?", conn, params=(emp_id,))
+
+def contas_da_empresa(emp_id, filtro_nome=None):
+    """{id: "cod - nome"} das contas do plano, em ordem de código."""
+    with transacao() as conn:
+        rows = conn.execute("SELECT id, cod, nome FROM plano_contas WHERE empresa_id=? AND (? IS NULL OR nome LIKE ?) ORDER BY cod",
+                            (emp_id, filtro_nome, f"%{filtro_nome}%")).fetchall()
+    return {r['id']: f"{r['cod']} - {r['nome']}" for r in rows}
+
+def mapa_contas(emp_id):
+    """Resolve tanto o rótulo "cod - nome" quanto apenas o código para o id da conta."""
+    with transacao() as conn:
+        rows = conn.execute("SELECT id, cod, nome FROM plano_contas WHERE empresa_id=? ORDER BY id DESC", (emp_id,)).fetchall()
+    mapa = {r['cod']: r['id'] for r in rows}
+    mapa.update({f"{r['cod']} - {r['nome']}": r['id'] for r in rows})
+    return mapa
+
+def conta_por_codigo(emp_id, cod):
+    with transacao() as conn:
+        row = conn.execute("SELECT id FROM plano_contas WHERE empresa_id=? AND cod=? ORDER BY id LIMIT 1", (emp_id, cod)).fetchone()
+    return row['id'] if row else None
+
+@com_retentativa
+def importar_plano_padrao(emp_id):
+    plano = [
+        ("1.01.01", "Caixa Geral", "Ativo"), ("1.01.02", "Banco Movimento", "Ativo"),
+        ("1.09.99", "A Classificar (Entradas)", "Ativo"), ("2.09.99", "A Classificar (Saídas)", "Passivo"),
+        ("2.01.01", "Fornecedores", "Passivo"), ("3.01.01", "Capital Social", "Patrimônio Líquido"),
+        ("4.01.01", "Receitas de Vendas", "Receita"), ("5.01.01", "Despesas Operacionais", "Despesa"),
+        ("5.01.04", "Provisão de Impostos", "Despesa"), ("2.01.03", "Impostos a Recolher", "Passivo")
+    ]
+    with transacao() as conn:
+        conn.executemany("INSERT INTO plano_contas (empresa_id, cod, nome, grupo) VALUES (?, ?, ?, ?)", 
+                       [(emp_id, c, n, g) for c, n, g in plano])
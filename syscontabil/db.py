@@ -0,0 +1,149 @@
+"""Camada de conexão SQLite do SysContábil.
+
+Cada thread (ou sessão do Streamlit, via `vincular`) reaproveita uma única conexão, aberta
+em modo WAL com pragmas ajustados, em vez de abrir uma nova a cada consulta. Fica fora do
+app.py porque o Streamlit reexecuta o script a cada interação e perderia o estado do módulo.
+"""
+import sqlite3
+import threading
+import time
+import functools
+import itertools
+import weakref
+from contextlib import contextmanager
+
+DB_NAME = "syscontabil_v5.db"
+# Espera do SQLite por um lock antes de devolver "database is locked"
+BUSY_TIMEOUT_MS = 5000
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -65536",      # 64 MiB
+    "PRAGMA mmap_size = 268435456",    # 256 MiB
+    "PRAGMA temp_store = MEMORY",
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",
+]
+TENTATIVAS = 5
+
+_local = threading.local()
+# Totais do processo; a contagem da rodada fica em `_local`, pois cada sessão roda na sua thread
+_contadores = {'conexoes_abertas': 0, 'consultas': 0, 'retentativas': 0}
+_lock_contadores = threading.Lock()
+_savepoints = itertools.count()
+
+def _somar(chave, n=1):
+    with _lock_contadores:
+        _contadores[chave] += n
+
+def _contar(_sql):
+    _somar('consultas')
+    _local.consultas_rodada = getattr(_local, 'consultas_rodada', 0) + 1
+
+def abrir_conexao(db_name=None):
+    """Abre uma conexão nova já configurada; prefira `get_db`, que reaproveita a da thread."""
+    conn = sqlite3.connect(db_name or DB_NAME, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    conn.set_trace_callback(_contar)
+    _somar('conexoes_abertas')
+    return conn
+
+def fechar_conexao(conn):
+    conn.close()
+    _somar('conexoes_abertas', -1)
+
+def get_db():
+    """Conexão da thread atual, aberta na primeira chamada e reaproveitada nas seguintes.
+
+    Para escrever, use `transacao()`: `with get_db() as conn` confirmaria também uma transação
+    que o chamador tenha aberta.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _local.conn = abrir_conexao()
+    return conn
+
+@contextmanager
+def transacao():
+    """Confirma (ou desfaz) ao sair, como `with conn:`, devolvendo a conexão da thread.
+
+    Dentro de uma transação já aberta (ex.: o BEGIN IMMEDIATE de uma importação) vira um SAVEPOINT:
+    um erro desfaz só o bloco e o commit continua com quem abriu a transação.
+    """
+    conn = get_db()
+    if not conn.in_transaction:
+        with conn:
+            yield conn
+        return
+    nome = f"sp_{next(_savepoints)}"
+    conn.execute(f"SAVEPOINT {nome}")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute(f"ROLLBACK TO {nome}")
+        conn.execute(f"RELEASE {nome}")
+        raise
+    conn.execute(f"RELEASE {nome}")
+
+def vincular(conn):
+    """Faz a thread atual usar `conn` (ex.: a conexão guardada na sessão do Streamlit)."""
+    _local.conn = conn
+
+def fechar():
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        fechar_conexao(conn)
+        _local.conn = None
+
+class _ConexaoSessao:
+    """Dono da conexão de uma sessão; ao ser coletado junto com o estado da sessão, fecha a conexão."""
+    def __init__(self):
+        self.conn = abrir_conexao()
+        weakref.finalize(self, fechar_conexao, self.conn)
+
+def conexao_da_sessao(estado):
+    """Conexão guardada em `estado` (o st.session_state), reaproveitada entre as reexecuções.
+
+    O Streamlit não avisa o fim da sessão; a conexão é fechada quando o estado dela é descartado.
+    """
+    if '_db' not in estado:
+        estado['_db'] = _ConexaoSessao()
+    return estado['_db'].conn
+
+class BancoOcupado(ValueError):
+    """O banco seguiu travado por outra escrita (ex.: uma importação) depois de todas as retentativas.
+
+    É um ValueError para chegar à tela como as demais validações, com uma mensagem para o usuário.
+    """
+
+def com_retentativa(func):
+    """Repete a operação quando o banco continua travado mesmo após o busy_timeout.
+
+    Só deve envolver operações atômicas (uma transação completa), que podem ser refeitas do zero.
+    Esgotadas as tentativas, levanta BancoOcupado.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for tentativa in range(TENTATIVAS):
+            try:
+                return func(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                msg = str(e)
+                if "locked" not in msg and "busy" not in msg:
+                    raise
+                if tentativa == TENTATIVAS - 1:
+                    raise BancoOcupado("Há uma importação ou outra gravação em andamento; tente novamente em instantes.") from e
+                _somar('retentativas')
+                time.sleep(0.1 * 2 ** tentativa)
+    return wrapper
+
+def iniciar_rodada():
+    """Zera o contador de consultas da execução atual do script (por thread)."""
+    _local.consultas_rodada = 0
+
+def estatisticas():
+    with _lock_contadores:
+        stats = dict(_contadores)
+    stats['consultas_rodada'] = getattr(_local, 'consultas_rodada', 0)
+    return stats
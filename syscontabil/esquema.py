@@ -0,0 +1,225 @@
+"""Esquema do banco: migrações versionadas e os gatilhos, índices e views que mantêm os dados derivados."""
+from .db import get_db
+
+# Grupo assumido para contas criadas automaticamente, pelo primeiro dígito do código
+GRUPO_POR_PREFIXO = {'1': 'Ativo', '2': 'Passivo', '3': 'Patrimônio Líquido', '4': 'Receita', '5': 'Despesa'}
+LOTE_MIGRACAO = 50000
+
+_SQL_SALDO_INC = """
+    INSERT INTO saldos_mensais (empresa_id, conta_id, mes, debito) VALUES (NEW.empresa_id, NEW.conta_debito_id, substr(NEW.data, 1, 7), NEW.valor)
+        ON CONFLICT(empresa_id, conta_id, mes) DO UPDATE SET debito = debito + excluded.debito;
+    INSERT INTO saldos_mensais (empresa_id, conta_id, mes, credito) VALUES (NEW.empresa_id, NEW.conta_credito_id, substr(NEW.data, 1, 7), NEW.valor)
+        ON CONFLICT(empresa_id, conta_id, mes) DO UPDATE SET credito = credito + excluded.credito;"""
+_SQL_SALDO_DEC = """
+    UPDATE saldos_mensais SET debito = debito - OLD.valor WHERE empresa_id=OLD.empresa_id AND conta_id=OLD.conta_debito_id AND mes=substr(OLD.data, 1, 7);
+    UPDATE saldos_mensais SET credito = credito - OLD.valor WHERE empresa_id=OLD.empresa_id AND conta_id=OLD.conta_credito_id AND mes=substr(OLD.data, 1, 7);"""
+# Os gatilhos mantêm saldos_mensais na mesma transação de qualquer escrita em lancamentos
+_SQL_GATILHOS = [
+    # Inserções em massa marcam saldos_adiados e aplicam o agregado de uma vez (ver saldos_em_lote)
+    f"CREATE TRIGGER IF NOT EXISTS trg_saldos_ins AFTER INSERT ON lancamentos WHEN NOT EXISTS (SELECT 1 FROM saldos_adiados) BEGIN {_SQL_SALDO_INC}\nEND",
+    f"CREATE TRIGGER IF NOT EXISTS trg_saldos_del AFTER DELETE ON lancamentos BEGIN {_SQL_SALDO_DEC}\nEND",
+    f"CREATE TRIGGER IF NOT EXISTS trg_saldos_upd AFTER UPDATE OF empresa_id, data, conta_debito_id, conta_credito_id, valor ON lancamentos BEGIN {_SQL_SALDO_DEC} {_SQL_SALDO_INC}\nEND",
+]
+_SQL_INDICES = [
+    "CREATE INDEX IF NOT EXISTS idx_lanc_emp_data ON lancamentos (empresa_id, data)",
+    "CREATE INDEX IF NOT EXISTS idx_lanc_emp_deb ON lancamentos (empresa_id, conta_debito_id, data, valor)",
+    "CREATE INDEX IF NOT EXISTS idx_lanc_emp_crd ON lancamentos (empresa_id, conta_credito_id, data, valor)",
+    "CREATE INDEX IF NOT EXISTS idx_plano_emp_cod ON plano_contas (empresa_id, cod)",
+]
+# Lançamentos com o rótulo "cod - nome" das contas montado na leitura: renomear uma conta não órfã o histórico
+_SQL_VIEW_LANCAMENTOS = """
+    CREATE VIEW IF NOT EXISTS vw_lancamentos AS
+    SELECT l.id, l.empresa_id, l.data, d.cod || ' - ' || d.nome AS conta_debito, c.cod || ' - ' || c.nome AS conta_credito,
+           l.valor, l.historico, l.conta_debito_id, l.conta_credito_id
+    FROM lancamentos l LEFT JOIN plano_contas d ON d.id = l.conta_debito_id LEFT JOIN plano_contas c ON c.id = l.conta_credito_id"""
+
+# Saldos mensais calculados direto dos lançamentos brutos (base da reconstrução e da verificação)
+SQL_SALDOS_BRUTOS = """
+    SELECT empresa_id, conta_id, mes, sum(deb) AS debito, sum(crd) AS credito FROM (
+        SELECT empresa_id, conta_debito_id AS conta_id, substr(data, 1, 7) AS mes, valor AS deb, 0 AS crd FROM lancamentos
+        UNION ALL
+        SELECT empresa_id, conta_credito_id, substr(data, 1, 7), 0, valor FROM lancamentos
+    ) WHERE (:emp IS NULL OR empresa_id = :emp) GROUP BY empresa_id, conta_id, mes"""
+# Saldos acumulados (débito e crédito desde o início) por conta até o mês {ate}: parte do último retrato de
+# saldos_fechados até esse mês e soma só os meses de saldos_mensais posteriores a ele
+SQL_SALDOS_ACUMULADOS = """
+    SELECT conta_id, sum(debito) AS debito, sum(credito) AS credito FROM (
+        SELECT conta_id, debito, credito FROM saldos_fechados
+        WHERE empresa_id = {emp} AND mes = (SELECT max(mes) FROM saldos_fechados WHERE empresa_id = {emp} AND mes <= {ate})
+        UNION ALL
+        SELECT conta_id, debito, credito FROM saldos_mensais
+        WHERE empresa_id = {emp} AND mes <= {ate} AND mes > coalesce((SELECT max(mes) FROM saldos_fechados WHERE empresa_id = {emp} AND mes <= {ate}), '')
+    ) GROUP BY conta_id"""
+# Retrato de fechamento do mês {ate}: os saldos acumulados de todas as contas com movimento
+_SQL_RETRATO = """
+    DELETE FROM saldos_fechados WHERE empresa_id = {emp} AND mes = {ate};
+    INSERT INTO saldos_fechados (empresa_id, mes, conta_id, debito, credito)
+        SELECT {emp}, {ate}, conta_id, debito, credito FROM (""" + SQL_SALDOS_ACUMULADOS + """) WHERE debito != 0 OR credito != 0;"""
+# Um lançamento num mês entra nos retratos desse mês em diante
+_SQL_RETRATO_INC = """
+    INSERT INTO saldos_fechados (empresa_id, mes, conta_id, debito)
+        SELECT DISTINCT NEW.empresa_id, mes, NEW.conta_debito_id, NEW.valor FROM saldos_fechados WHERE empresa_id = NEW.empresa_id AND mes >= substr(NEW.data, 1, 7)
+        ON CONFLICT(empresa_id, mes, conta_id) DO UPDATE SET debito = debito + excluded.debito;
+    INSERT INTO saldos_fechados (empresa_id, mes, conta_id, credito)
+        SELECT DISTINCT NEW.empresa_id, mes, NEW.conta_credito_id, NEW.valor FROM saldos_fechados WHERE empresa_id = NEW.empresa_id AND mes >= substr(NEW.data, 1, 7)
+        ON CONFLICT(empresa_id, mes, conta_id) DO UPDATE SET credito = credito + excluded.credito;"""
+_SQL_RETRATO_DEC = """
+    UPDATE saldos_fechados SET debito = debito - OLD.valor WHERE empresa_id = OLD.empresa_id AND conta_id = OLD.conta_debito_id AND mes >= substr(OLD.data, 1, 7);
+    UPDATE saldos_fechados SET credito = credito - OLD.valor WHERE empresa_id = OLD.empresa_id AND conta_id = OLD.conta_credito_id AND mes >= substr(OLD.data, 1, 7);"""
+SQL_VERSAO_INC = "INSERT INTO versao_dados (empresa_id, versao) VALUES ({}, 1) ON CONFLICT(empresa_id) DO UPDATE SET versao = versao + 1;"
+
+def _migracao_1_esquema_base(conn):
+    conn.execute('CREATE TABLE IF NOT EXISTS usuarios (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, password TEXT, nome_completo TEXT)')
+    conn.execute('CREATE TABLE IF NOT EXISTS empresas (id INTEGER PRIMARY KEY AUTOINCREMENT, nome TEXT, cnpj TEXT, regime TEXT, usuario_id INTEGER, FOREIGN KEY(usuario_id) REFERENCES usuarios(id))')
+    conn.execute('CREATE TABLE IF NOT EXISTS plano_contas (id INTEGER PRIMARY KEY AUTOINCREMENT, empresa_id INTEGER, cod TEXT, nome TEXT, grupo TEXT, FOREIGN KEY(empresa_id) REFERENCES empresas(id))')
+    conn.execute('CREATE TABLE IF NOT EXISTS lancamentos (id INTEGER PRIMARY KEY AUTOINCREMENT, empresa_id INTEGER, data TEXT, conta_debito TEXT, conta_credito TEXT, valor REAL, historico TEXT, FOREIGN KEY(empresa_id) REFERENCES empresas(id))')
+    conn.execute('CREATE TABLE IF NOT EXISTS fechamentos (id INTEGER PRIMARY KEY AUTOINCREMENT, empresa_id INTEGER, mes_ano TEXT, UNIQUE(empresa_id, mes_ano), FOREIGN KEY(empresa_id) REFERENCES empresas(id))')
+
+def _migracao_2_contas_inteiras(conn):
+    """Troca o rótulo "cod - nome" dos lançamentos por chaves inteiras em plano_contas(id).
+
+    A cópia é feita em lotes confirmados um a um e retoma de onde parou se for interrompida;
+    só a troca final das tabelas acontece na transação que grava a nova versão.
+    """
+    # O texto gravado nos lançamentos é o rótulo "cod - nome" ou, vindo do CSV antigo, só o código;
+    # o rótulo tem precedência e, entre contas repetidas, vale a mais antiga
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS mapa_contas (empresa_id INTEGER, conta TEXT, conta_id INTEGER, PRIMARY KEY(empresa_id, conta))")
+    conn.execute("DELETE FROM mapa_contas")
+    conn.execute("INSERT OR IGNORE INTO mapa_contas SELECT empresa_id, cod || ' - ' || nome, id FROM plano_contas ORDER BY id")
+    conn.execute("INSERT OR IGNORE INTO mapa_contas SELECT empresa_id, cod, id FROM plano_contas ORDER BY id")
+
+    # Contas citadas nos lançamentos mas ausentes do plano são criadas para não perder histórico. A conta
+    # criada devolve o mesmo texto pelo rótulo ou pelo código, então uma retomada não a cria de novo.
+    orfas = conn.execute("""
+        SELECT DISTINCT l.empresa_id, l.conta FROM (
+            SELECT empresa_id, conta_debito AS conta FROM lancamentos UNION SELECT empresa_id, conta_credito FROM lancamentos
+        ) l WHERE l.conta IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM mapa_contas m WHERE m.empresa_id = l.empresa_id AND m.conta = l.conta)
+        ORDER BY l.empresa_id, instr(l.conta, ' - ') = 0, l.conta""").fetchall()
+    for emp, conta in orfas:
+        # Rótulos vêm antes: o código solto de uma conta órfã reaproveita a conta criada pelo rótulo dela
+        if conn.execute("SELECT 1 FROM mapa_contas WHERE empresa_id = ? AND conta = ?", (emp, conta)).fetchone():
+            continue
+        cod, _, nome = conta.partition(" - ")
+        conta_id = conn.execute("INSERT INTO plano_contas (empresa_id, cod, nome, grupo) VALUES (?, ?, ?, ?)",
+                                (emp, cod, nome or conta, GRUPO_POR_PREFIXO.get(cod[:1], 'Ativo'))).lastrowid
+        conn.executemany("INSERT OR IGNORE INTO mapa_contas VALUES (?, ?, ?)", [(emp, conta, conta_id), (emp, cod, conta_id)])
+
+    conn.execute('''CREATE TABLE IF NOT EXISTS lancamentos_v2 (id INTEGER PRIMARY KEY AUTOINCREMENT, empresa_id INTEGER, data TEXT,
+        conta_debito_id INTEGER, conta_credito_id INTEGER, valor REAL, historico TEXT,
+        FOREIGN KEY(empresa_id) REFERENCES empresas(id), FOREIGN KEY(conta_debito_id) REFERENCES plano_contas(id), FOREIGN KEY(conta_credito_id) REFERENCES plano_contas(id))''')
+    conn.commit()
+
+    ultimo = conn.execute("SELECT coalesce(max(id), 0) FROM lancamentos_v2").fetchone()[0]
+    while True:
+        copiados = conn.execute("""
+            INSERT INTO lancamentos_v2 (id, empresa_id, data, conta_debito_id, conta_credito_id, valor, historico)
+            SELECT l.id, l.empresa_id, l.data, d.conta_id, c.conta_id, l.valor, l.historico FROM lancamentos l
+            LEFT JOIN mapa_contas d ON d.empresa_id = l.empresa_id AND d.conta = l.conta_debito
+            LEFT JOIN mapa_contas c ON c.empresa_id = l.empresa_id AND c.conta = l.conta_credito
+            WHERE l.id > ? ORDER BY l.id LIMIT ?""", (ultimo, LOTE_MIGRACAO)).rowcount
+        conn.commit()
+        if copiados < LOTE_MIGRACAO: break
+        ultimo = conn.execute("SELECT max(id) FROM lancamentos_v2").fetchone()[0]
+
+    conn.execute("BEGIN")
+    # Derrubar a tabela antiga leva junto os gatilhos de saldos_mensais por rótulo
+    conn.execute("DROP TABLE lancamentos")
+    conn.execute("ALTER TABLE lancamentos_v2 RENAME TO lancamentos")
+    conn.execute("DROP TABLE IF EXISTS saldos_mensais")
+    conn.execute('CREATE TABLE saldos_mensais (empresa_id INTEGER, conta_id INTEGER, mes TEXT, debito REAL DEFAULT 0, credito REAL DEFAULT 0, PRIMARY KEY(empresa_id, conta_id, mes))')
+    conn.execute(f"INSERT INTO saldos_mensais (empresa_id, conta_id, mes, debito, credito) {SQL_SALDOS_BRUTOS}", {'emp': None})
+    for sql in _SQL_GATILHOS + _SQL_INDICES + [_SQL_VIEW_LANCAMENTOS]:
+        conn.execute(sql)
+
+def _migracao_3_saldos_adiados(conn):
+    conn.execute("CREATE TABLE IF NOT EXISTS saldos_adiados (id INTEGER PRIMARY KEY)")
+    conn.execute("DROP TRIGGER IF EXISTS trg_saldos_ins")
+    conn.execute(_SQL_GATILHOS[0])
+
+def _migracao_4_fitid_ofx(conn):
+    """Guarda a conta do extrato e o FITID de cada transação OFX para descartar reimportações."""
+    conn.execute("ALTER TABLE lancamentos ADD COLUMN ofx_conta TEXT")
+    conn.execute("ALTER TABLE lancamentos ADD COLUMN fitid TEXT")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_lanc_ofx ON lancamentos (empresa_id, ofx_conta, fitid) WHERE fitid IS NOT NULL")
+
+def _migracao_5_busca_historico(conn):
+    """Índice FTS5 sobre lancamentos.historico, mantido por gatilhos."""
+    conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS lancamentos_fts USING fts5(historico, content='lancamentos', content_rowid='id', tokenize='unicode61 remove_diacritics 2')")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_fts_ins AFTER INSERT ON lancamentos BEGIN
+        INSERT INTO lancamentos_fts (rowid, historico) VALUES (NEW.id, NEW.historico);
+    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_fts_del AFTER DELETE ON lancamentos BEGIN
+        INSERT INTO lancamentos_fts (lancamentos_fts, rowid, historico) VALUES ('delete', OLD.id, OLD.historico);
+    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_fts_upd AFTER UPDATE OF historico ON lancamentos BEGIN
+        INSERT INTO lancamentos_fts (lancamentos_fts, rowid, historico) VALUES ('delete', OLD.id, OLD.historico);
+        INSERT INTO lancamentos_fts (rowid, historico) VALUES (NEW.id, NEW.historico);
+    END""")
+    conn.execute("INSERT INTO lancamentos_fts (lancamentos_fts) VALUES ('rebuild')")
+
+def _migracao_6_versao_dados(conn):
+    """Contador por empresa incrementado a cada escrita; é a chave do cache de resultados (cache.py)."""
+    conn.execute("CREATE TABLE IF NOT EXISTS versao_dados (empresa_id INTEGER PRIMARY KEY, versao INTEGER NOT NULL DEFAULT 0)")
+    for tabela in ("lancamentos", "plano_contas", "fechamentos"):
+        # Inserções em massa de lançamentos incrementam uma única vez, ao final de saldos_em_lote
+        quando = "WHEN NOT EXISTS (SELECT 1 FROM saldos_adiados)" if tabela == "lancamentos" else ""
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_versao_{tabela}_ins AFTER INSERT ON {tabela} {quando} BEGIN {SQL_VERSAO_INC.format('NEW.empresa_id')} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_versao_{tabela}_del AFTER DELETE ON {tabela} BEGIN {SQL_VERSAO_INC.format('OLD.empresa_id')} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_versao_{tabela}_upd AFTER UPDATE ON {tabela} BEGIN {SQL_VERSAO_INC.format('OLD.empresa_id')} {SQL_VERSAO_INC.format('NEW.empresa_id')} END")
+
+def _migracao_7_saldos_fechados(conn):
+    """Retrato dos saldos acumulados de cada mês fechado, para que os relatórios não releiam o histórico trancado.
+
+    Fechar um mês grava o retrato e reabrir o descarta; lançamentos gravados em meses anteriores
+    (abertos) ajustam os retratos posteriores, como os gatilhos de saldos_mensais.
+    """
+    conn.execute("""CREATE TABLE IF NOT EXISTS saldos_fechados (empresa_id INTEGER, mes TEXT, conta_id INTEGER,
+        debito REAL DEFAULT 0, credito REAL DEFAULT 0, PRIMARY KEY(empresa_id, mes, conta_id))""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_saldos_emp_mes ON saldos_mensais (empresa_id, mes)")
+    retrato = _SQL_RETRATO.format(emp='NEW.empresa_id', ate='NEW.mes_ano')
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_fechamento_ins AFTER INSERT ON fechamentos BEGIN {retrato}\nEND")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS trg_fechamento_del AFTER DELETE ON fechamentos BEGIN
+        DELETE FROM saldos_fechados WHERE empresa_id = OLD.empresa_id AND mes = OLD.mes_ano;
+    END""")
+    # Inserções em massa ajustam os retratos de uma vez, ao final de saldos_em_lote
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_retrato_ins AFTER INSERT ON lancamentos WHEN NOT EXISTS (SELECT 1 FROM saldos_adiados) BEGIN {_SQL_RETRATO_INC}\nEND")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_retrato_del AFTER DELETE ON lancamentos BEGIN {_SQL_RETRATO_DEC}\nEND")
+    conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_retrato_upd AFTER UPDATE OF empresa_id, data, conta_debito_id, conta_credito_id, valor ON lancamentos BEGIN {_SQL_RETRATO_DEC} {_SQL_RETRATO_INC}\nEND")
+    refazer_saldos_fechados(conn)
+
+def refazer_saldos_fechados(conn, emp_id=None):
+    """Recria os retratos de todos os meses fechados, em ordem, na conexão informada (sem commit)."""
+    conn.execute("DELETE FROM saldos_fechados WHERE (:emp IS NULL OR empresa_id = :emp)", {'emp': emp_id})
+    retrato = _SQL_RETRATO.format(emp=':emp', ate=':ate').split(";")
+    for f in conn.execute("SELECT empresa_id, mes_ano FROM fechamentos WHERE (:emp IS NULL OR empresa_id = :emp) ORDER BY empresa_id, mes_ano", {'emp': emp_id}).fetchall():
+        for sql in retrato:
+            if sql.strip(): conn.execute(sql, {'emp': f['empresa_id'], 'ate': f['mes_ano']})
+
+def _migracao_8_tarefas_confirmadas(conn):
+    """Marca, na mesma transação dos dados, as tarefas de escrita já gravadas (ver tarefas.py)."""
+    conn.execute("CREATE TABLE IF NOT EXISTS tarefas_confirmadas (chave TEXT PRIMARY KEY, tarefa_id INTEGER, confirmada_em TEXT DEFAULT CURRENT_TIMESTAMP)")
+
+# Cada migração roda uma única vez, na ordem; a versão aplicada fica em PRAGMA user_version
+_MIGRACOES = [_migracao_1_esquema_base, _migracao_2_contas_inteiras, _migracao_3_saldos_adiados, _migracao_4_fitid_ofx,
+              _migracao_5_busca_historico, _migracao_6_versao_dados, _migracao_7_saldos_fechados,
+              _migracao_8_tarefas_confirmadas]
+
+def init_db():
+    """Aplica as migrações pendentes, confirmando uma a uma.
+
+    Usa a conexão da thread diretamente, e não `transacao()`: as migrações confirmam o próprio
+    trabalho (a 2 em lotes), então não pode haver transação do chamador aberta.
+    """
+    conn = get_db()
+    if conn.in_transaction:
+        raise RuntimeError("init_db() não pode rodar dentro de uma transação aberta.")
+    versao = conn.execute("PRAGMA user_version").fetchone()[0]
+    for num, migracao in enumerate(_MIGRACOES[versao:], start=versao + 1):
+        try:
+            migracao(conn)
+            conn.execute(f"PRAGMA user_version = {num}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
@@ -0,0 +1,134 @@
+"""Apuração fiscal em lote: várias empresas e vários meses de uma vez, sem depender do Streamlit.
+
+Uso pela linha de comando:
+    python -m syscontabil.fiscal --de 2025-01 --ate 2025-03 --todas [--provisionar] [--saida apuracao.csv]
+"""
+import argparse
+import sys
+import numpy as np
+import pandas as pd
+from . import db
+from .db import get_db, transacao, com_retentativa
+from .esquema import init_db
+
+REGIMES = ["Simples Nacional", "Lucro Presumido", "MEI"]
+# Valores de referência aproximados da guia fixa do MEI
+DAS_MEI = {"Comércio/Indústria": 71.60, "Serviços": 75.60, "Ambos": 76.60}
+# Bases de presunção do Lucro Presumido por atividade: (IRPJ, CSLL)
+PRESUNCAO_LP = {"Serviços": (0.32, 0.32), "Comércio": (0.08, 0.12)}
+ALIQ_PIS, ALIQ_COFINS, ALIQ_IRPJ, ALIQ_CSLL = 0.0065, 0.03, 0.15, 0.09
+CONTA_PROVISAO, CONTA_RECOLHER = "5.01.04", "2.01.03"
+
+def _temp_empresas(conn, empresas):
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS apuracao_empresas (empresa_id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM apuracao_empresas")
+    conn.executemany("INSERT OR IGNORE INTO apuracao_empresas VALUES (?)", ((int(e),) for e in empresas))
+
+def faturamento_por_mes(empresas, mes_ini, mes_fim):
+    """Receita (créditos no grupo 4) por empresa e mês "YYYY-MM", com zero onde não houve movimento."""
+    meses = pd.period_range(mes_ini, mes_fim, freq='M').strftime('%Y-%m')
+    with transacao() as conn:
+        _temp_empresas(conn, empresas)
+        df_e = pd.read_sql_query("SELECT e.id AS empresa_id, e.nome, e.regime FROM empresas e JOIN apuracao_empresas a ON a.empresa_id = e.id", conn)
+        df_f = pd.read_sql_query("""
+            SELECT s.empresa_id, s.mes, sum(s.credito) AS faturamento FROM saldos_mensais s
+            JOIN apuracao_empresas a ON a.empresa_id = s.empresa_id JOIN plano_contas p ON p.id = s.conta_id
+            WHERE p.cod >= '4' AND p.cod < '5' AND s.mes BETWEEN ? AND ? GROUP BY s.empresa_id, s.mes""", conn, params=(meses[0], meses[-1]))
+    grade = df_e.merge(pd.DataFrame({'mes': meses}), how='cross')
+    grade = grade.merge(df_f, on=['empresa_id', 'mes'], how='left')
+    grade['faturamento'] = grade['faturamento'].fillna(0.0)
+    return grade
+
+def apurar(empresas, mes_ini, mes_fim, atividade_mei="Comércio/Indústria", aliquota_simples=6.0, atividade_lp="Serviços"):
+    """Impostos devidos por empresa, mês e tributo, conforme o regime de cada empresa.
+
+    Retorna um DataFrame com empresa_id, nome, regime, mes, faturamento, imposto e valor.
+    """
+    df = faturamento_por_mes(empresas, mes_ini, mes_fim)
+    fat, regime = df['faturamento'], df['regime']
+    mei, sn, lp = regime == "MEI", regime == "Simples Nacional", regime == "Lucro Presumido"
+    presuncao_irpj, presuncao_csll = PRESUNCAO_LP[atividade_lp]
+    tributos = {
+        "DAS MEI": np.where(mei, DAS_MEI[atividade_mei], np.nan),
+        "DAS Simples Nacional": np.where(sn, fat * (aliquota_simples / 100), np.nan),
+        "PIS": np.where(lp, fat * ALIQ_PIS, np.nan),
+        "COFINS": np.where(lp, fat * ALIQ_COFINS, np.nan),
+        "IRPJ": np.where(lp, fat * presuncao_irpj * ALIQ_IRPJ, np.nan),
+        "CSLL": np.where(lp, fat * presuncao_csll * ALIQ_CSLL, np.nan),
+    }
+    # Cada tributo é arredondado aos centavos antes de virar linha, como será lançado e somado
+    df = df.assign(**tributos).round(dict.fromkeys(tributos, 2)).melt(id_vars=['empresa_id', 'nome', 'regime', 'mes', 'faturamento'],
+                                    value_vars=list(tributos), var_name='imposto', value_name='valor')
+    return df.dropna(subset=['valor']).sort_values(['empresa_id', 'mes', 'imposto'], ignore_index=True)
+
+@com_retentativa
+def provisionar(df_apuracao, ao_confirmar=None):
+    """Lança as provisões (D 5.01.04 / C 2.01.03, no último dia do mês) numa única transação.
+
+    Meses fechados e empresas sem as contas de provisão no plano são pulados.
+    Retorna um resumo por empresa e mês com a situação de cada um. `ao_confirmar(conn)` roda na
+    transação, antes do commit.
+    """
+    df = df_apuracao[df_apuracao['valor'] > 0].copy()
+    df['data'] = pd.PeriodIndex(df['mes'], freq='M').end_time.strftime('%Y-%m-%d')
+    df['historico'] = "Provisão " + df['imposto'] + " ref " + df['mes'].str[5:7] + "/" + df['mes'].str[:4]
+    conn = get_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        _temp_empresas(conn, df['empresa_id'].unique())
+        fechados = pd.read_sql_query("SELECT f.empresa_id, f.mes_ano AS mes FROM fechamentos f JOIN apuracao_empresas a ON a.empresa_id = f.empresa_id", conn)
+        contas = pd.read_sql_query("""
+            SELECT a.empresa_id,
+                   (SELECT min(id) FROM plano_contas p WHERE p.empresa_id = a.empresa_id AND p.cod = ?) AS deb,
+                   (SELECT min(id) FROM plano_contas p WHERE p.empresa_id = a.empresa_id AND p.cod = ?) AS crd
+            FROM apuracao_empresas a""", conn, params=(CONTA_PROVISAO, CONTA_RECOLHER))
+        df = df.merge(contas, on='empresa_id', how='left')
+        fechado = df.set_index(['empresa_id', 'mes']).index.isin(fechados.set_index(['empresa_id', 'mes']).index)
+        df['situacao'] = np.select([fechado, df['deb'].isna() | df['crd'].isna()], ["período fechado", "sem contas de provisão"], default="provisionado")
+        ok = df[df['situacao'] == "provisionado"]
+        conn.executemany("""
+            INSERT INTO lancamentos (empresa_id, data, conta_debito_id, conta_credito_id, valor, historico)
+            VALUES (?, ?, ?, ?, ?, ?)""",
+            zip(ok['empresa_id'].astype(int), ok['data'], ok['deb'].astype(int), ok['crd'].astype(int), ok['valor'], ok['historico']))
+        if ao_confirmar: ao_confirmar(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return df.groupby(['empresa_id', 'nome', 'mes', 'situacao'], as_index=False)['valor'].sum()
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Apuração fiscal em lote do SysContábil.")
+    ap.add_argument("--de", required=True, help="Mês inicial (YYYY-MM)")
+    ap.add_argument("--ate", help="Mês final (YYYY-MM); padrão: o inicial")
+    alvo = ap.add_mutually_exclusive_group(required=True)
+    alvo.add_argument("--empresas", help="IDs separados por vírgula")
+    alvo.add_argument("--usuario", type=int, help="Todas as empresas do usuário")
+    alvo.add_argument("--todas", action="store_true", help="Todas as empresas do banco")
+    ap.add_argument("--atividade-mei", default="Comércio/Indústria", choices=list(DAS_MEI))
+    ap.add_argument("--aliquota-simples", type=float, default=6.0, help="Alíquota efetiva do Simples (%%)")
+    ap.add_argument("--atividade-lp", default="Serviços", choices=list(PRESUNCAO_LP))
+    ap.add_argument("--provisionar", action="store_true", help="Lança as provisões no banco")
+    ap.add_argument("--saida", help="Grava o resultado em CSV em vez de imprimir")
+    ap.add_argument("--db", default=db.DB_NAME, help="Arquivo do banco")
+    args = ap.parse_args(argv)
+
+    db.DB_NAME = args.db
+    init_db()
+    if args.empresas:
+        empresas = [int(e) for e in args.empresas.split(",")]
+    else:
+        with transacao() as conn:
+            rows = conn.execute("SELECT id FROM empresas WHERE (? IS NULL OR usuario_id = ?)", (args.usuario, args.usuario)).fetchall()
+        empresas = [r['id'] for r in rows]
+
+    res = apurar(empresas, args.de, args.ate or args.de, args.atividade_mei, args.aliquota_simples, args.atividade_lp)
+    if args.provisionar:
+        res = provisionar(res)
+    if args.saida:
+        res.to_csv(args.saida, index=False)
+    else:
+        print(res.to_string(index=False))
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,97 @@
+"""Importação de lançamentos a partir de CSV e de extratos OFX já lidos (ver leitor_ofx)."""
+import io
+import numpy as np
+import pandas as pd
+from .db import get_db, com_retentativa
+from .contas import mapa_contas, conta_por_codigo
+from .lancamentos import saldos_em_lote, inserir_lancamentos
+from .periodos import meses_fechados, mascara_periodo_fechado
+
+LOTE_IMPORTACAO = 50000
+COLUNAS_CSV = ['data', 'conta_debito', 'conta_credito', 'valor', 'historico']
+
+@com_retentativa
+def importar_csv(emp_id, arquivo, tamanho_lote=LOTE_IMPORTACAO, progresso=None, ao_confirmar=None):
+    """Importa lançamentos de um CSV em lotes, com validação vetorizada e uma única transação.
+
+    Retorna (aceitos, rejeitados), onde rejeitados traz a linha do arquivo e o motivo.
+    Qualquer erro desfaz a importação inteira. `progresso(fracao, aceitos, rejeitados)` é
+    chamado ao fim de cada lote e `ao_confirmar(conn)`, na própria transação, logo antes do commit.
+    """
+    mapa = mapa_contas(emp_id)
+    # Carregado antes do BEGIN, fora da transação da importação
+    fechados = meses_fechados(emp_id)
+    tamanho = None
+    if hasattr(arquivo, 'seek'):
+        tamanho = arquivo.seek(0, io.SEEK_END) or None
+        arquivo.seek(0)
+    aceitos, rejeitados = 0, []
+    conn = get_db()
+    try:
+        # IMMEDIATE reserva a escrita já no início: em WAL, promover uma leitura a escrita pode falhar sem esperar
+        conn.execute("BEGIN IMMEDIATE")
+        with saldos_em_lote(conn, emp_id):
+            for lote in pd.read_csv(arquivo, usecols=COLUNAS_CSV, dtype=str, chunksize=tamanho_lote):
+                datas = pd.to_datetime(lote['data'], format='%Y-%m-%d', errors='coerce')
+                datas = datas.fillna(pd.to_datetime(lote['data'], format='%d/%m/%Y', errors='coerce'))
+                valores = pd.to_numeric(lote['valor'], errors='coerce')
+                deb = lote['conta_debito'].str.strip().map(mapa)
+                crd = lote['conta_credito'].str.strip().map(mapa)
+                motivo = pd.Series(np.select(
+                    [datas.isna(), valores.isna(), deb.isna(), crd.isna(), deb == crd, mascara_periodo_fechado(emp_id, datas, fechados)],
+                    ["Data inválida", "Valor inválido", "Conta débito fora do plano", "Conta crédito fora do plano", "Contas iguais", "Período fechado"],
+                    default=""), index=lote.index)
+                ok = motivo == ""
+                hist = lote['historico'].astype(object).where(lote['historico'].notna(), None)
+                dias = np.datetime_as_string(datas[ok].to_numpy(dtype='datetime64[D]'), unit='D')
+                inserir_lancamentos(conn, emp_id, zip(dias, deb[ok].astype(int), crd[ok].astype(int), valores[ok], hist[ok]))
+                aceitos += int(ok.sum())
+                if not ok.all():
+                    # +2: cabeçalho e numeração a partir de 1
+                    rejeitados.append(lote[~ok].assign(linha=lote.index[~ok] + 2, motivo=motivo[~ok]))
+                if progresso:
+                    fracao = min(arquivo.tell() / tamanho, 1.0) if tamanho else 0.0
+                    progresso(fracao, aceitos, sum(len(r) for r in rejeitados))
+        if ao_confirmar: ao_confirmar(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    df_rej = pd.concat(rejeitados, ignore_index=True) if rejeitados else pd.DataFrame(columns=['linha', 'motivo'] + COLUNAS_CSV)
+    return aceitos, df_rej[['linha', 'motivo'] + COLUNAS_CSV]
+
+@com_retentativa
+def importar_ofx(emp_id, df_ofx, conta_banco_id, ao_confirmar=None):
+    """Lança as transações lidas por ler_ofx_lote numa única transação.
+
+    Valores positivos debitam o banco contra 1.09.99 e negativos o creditam contra 2.09.99.
+    Transações já importadas (mesma conta do extrato e FITID) são descartadas por um anti-join.
+    Retorna (gravados, repetidos, em_periodo_fechado). `ao_confirmar(conn)` roda na transação, antes do commit.
+    """
+    c_saidas, c_entradas = conta_por_codigo(emp_id, "2.09.99"), conta_por_codigo(emp_id, "1.09.99")
+    if not (c_saidas and c_entradas):
+        raise ValueError("Cadastre as contas 1.09.99 e 2.09.99 (A Classificar) no plano.")
+    fechado = mascara_periodo_fechado(emp_id, df_ofx['data'])
+    df = df_ofx[~fechado]
+    # Extratos sobrepostos no mesmo lote trazem a mesma transação mais de uma vez
+    df = pd.concat([df[df['fitid'].isna()], df[df['fitid'].notna()].drop_duplicates(['conta_ofx', 'fitid'])])
+    conn = get_db()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS ofx_lote (conta_ofx TEXT, fitid TEXT, data TEXT, valor REAL, memo TEXT)")
+        conn.execute("DELETE FROM ofx_lote")
+        conn.executemany("INSERT INTO ofx_lote VALUES (?,?,?,?,?)", df[['conta_ofx', 'fitid', 'data', 'valor', 'memo']].itertuples(index=False, name=None))
+        with saldos_em_lote(conn, emp_id):
+            gravados = conn.execute("""
+                INSERT INTO lancamentos (empresa_id, data, conta_debito_id, conta_credito_id, valor, historico, ofx_conta, fitid)
+                SELECT :emp, s.data, d.id, c.id, abs(s.valor), s.memo, s.conta_ofx, s.fitid FROM ofx_lote s
+                JOIN plano_contas d ON d.id = CASE WHEN s.valor > 0 THEN :banco ELSE :saidas END
+                JOIN plano_contas c ON c.id = CASE WHEN s.valor < 0 THEN :banco ELSE :entradas END
+                WHERE NOT EXISTS (SELECT 1 FROM lancamentos l WHERE l.empresa_id = :emp AND l.ofx_conta = s.conta_ofx AND l.fitid = s.fitid)""",
+                {'emp': emp_id, 'banco': conta_banco_id, 'saidas': c_saidas, 'entradas': c_entradas}).rowcount
+        if ao_confirmar: ao_confirmar(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return gravados, len(df_ofx) - int(fechado.sum()) - gravados, int(fechado.sum())
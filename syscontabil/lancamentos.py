@@ -0,0 +1,150 @@
+"""Livro de lançamentos: gravação, exclusão, consulta paginada e os saldos mensais materializados.
+
+Uso pela linha de comando (manutenção dos saldos materializados):
+    python -m syscontabil.lancamentos --verificar|--reconstruir [--empresa N] [--db arquivo.db]
+"""
+import argparse
+import sys
+from contextlib import contextmanager
+import pandas as pd
+from . import db
+from .db import transacao, com_retentativa
+from .esquema import SQL_SALDOS_BRUTOS, SQL_VERSAO_INC, init_db, refazer_saldos_fechados
+from .periodos import is_periodo_fechado
+
+LANCAMENTOS_POR_PAGINA = 50
+
+_SQL_INSERIR_LANCAMENTO = """
+    INSERT INTO lancamentos (empresa_id, data, conta_debito_id, conta_credito_id, valor, historico)
+    SELECT :emp, :data, d.id, c.id, :valor, :hist FROM plano_contas d, plano_contas c WHERE d.id = :deb AND c.id = :crd"""
+
+@com_retentativa
+def reconstruir_saldos(emp_id=None):
+    """Recria saldos_mensais e os retratos dos meses fechados a partir de lancamentos (todas as empresas se emp_id for None)."""
+    with transacao() as conn:
+        conn.execute("DELETE FROM saldos_mensais WHERE (:emp IS NULL OR empresa_id = :emp)", {'emp': emp_id})
+        conn.execute(f"INSERT INTO saldos_mensais (empresa_id, conta_id, mes, debito, credito) {SQL_SALDOS_BRUTOS}", {'emp': emp_id})
+        refazer_saldos_fechados(conn, emp_id)
+
+def verificar_saldos(emp_id=None):
+    """Confere saldos_mensais contra os lançamentos brutos; retorna as linhas divergentes."""
+    with transacao() as conn:
+        brutos = pd.read_sql_query(SQL_SALDOS_BRUTOS, conn, params={'emp': emp_id})
+        mat = pd.read_sql_query("SELECT empresa_id, conta_id, mes, debito, credito FROM saldos_mensais WHERE (:emp IS NULL OR empresa_id = :emp)", conn, params={'emp': emp_id})
+    df = brutos.merge(mat, on=['empresa_id', 'conta_id', 'mes'], how='outer', suffixes=('_bruto', '_saldo')).fillna(0.0)
+    diverge = ((df['debito_bruto'] - df['debito_saldo']).abs() > 0.005) | ((df['credito_bruto'] - df['credito_saldo']).abs() > 0.005)
+    return df[diverge].reset_index(drop=True)
+
+@contextmanager
+def saldos_em_lote(conn, emp_id):
+    """Suspende os gatilhos de saldos durante uma inserção em massa e aplica o agregado ao final.
+
+    Deve envolver apenas inserções da empresa, dentro de uma transação aberta: a marca em
+    saldos_adiados só é visível para a própria transação, então as demais conexões seguem normais.
+    """
+    inicio = conn.execute("SELECT coalesce(max(id), 0) FROM lancamentos").fetchone()[0]
+    conn.execute("INSERT INTO saldos_adiados DEFAULT VALUES")
+    yield
+    # O "+" tira empresa_id do índice: as linhas novas são lidas pela faixa de id, não pelo histórico da empresa
+    conn.execute("""
+        INSERT INTO saldos_mensais (empresa_id, conta_id, mes, debito, credito)
+        SELECT empresa_id, conta_id, mes, sum(deb), sum(crd) FROM (
+            SELECT empresa_id, conta_debito_id AS conta_id, substr(data, 1, 7) AS mes, valor AS deb, 0 AS crd FROM lancamentos WHERE id > :inicio AND +empresa_id = :emp
+            UNION ALL
+            SELECT empresa_id, conta_credito_id, substr(data, 1, 7), 0, valor FROM lancamentos WHERE id > :inicio AND +empresa_id = :emp
+        ) WHERE true GROUP BY empresa_id, conta_id, mes
+        ON CONFLICT(empresa_id, conta_id, mes) DO UPDATE SET debito = debito + excluded.debito, credito = credito + excluded.credito""",
+        {'emp': emp_id, 'inicio': inicio})
+    # Lançamentos em meses anteriores a um fechamento entram no retrato dele e dos seguintes
+    ultimo = conn.execute("SELECT max(mes) FROM saldos_fechados WHERE empresa_id = ?", (emp_id,)).fetchone()[0]
+    if ultimo:
+        conn.execute("""
+            INSERT INTO saldos_fechados (empresa_id, mes, conta_id, debito, credito)
+            SELECT :emp, f.mes, n.conta_id, sum(n.deb), sum(n.crd) FROM (
+                SELECT conta_debito_id AS conta_id, substr(data, 1, 7) AS mes, valor AS deb, 0 AS crd FROM lancamentos WHERE id > :inicio AND +empresa_id = :emp AND data < :limite
+                UNION ALL
+                SELECT conta_credito_id, substr(data, 1, 7), 0, valor FROM lancamentos WHERE id > :inicio AND +empresa_id = :emp AND data < :limite
+            ) n JOIN (SELECT DISTINCT mes FROM saldos_fechados WHERE empresa_id = :emp) f ON f.mes >= n.mes
+            WHERE true GROUP BY f.mes, n.conta_id
+            ON CONFLICT(empresa_id, mes, conta_id) DO UPDATE SET debito = debito + excluded.debito, credito = credito + excluded.credito""",
+            {'emp': emp_id, 'inicio': inicio, 'limite': ultimo + "-32"})
+    conn.execute("DELETE FROM saldos_adiados")
+    conn.execute(SQL_VERSAO_INC.format('?'), (emp_id,))
+
+def inserir_lancamentos(conn, emp_id, linhas):
+    """Grava (data, conta_debito_id, conta_credito_id, valor, historico) na conexão informada, sem commit."""
+    conn.executemany(_SQL_INSERIR_LANCAMENTO, ({'emp': emp_id, 'data': str(d), 'deb': deb, 'crd': crd, 'valor': v, 'hist': h} for d, deb, crd, v, h in linhas))
+
+@com_retentativa
+def lancar(emp_id, data, conta_debito_id, conta_credito_id, valor, historico):
+    """Grava um lançamento manual; levanta ValueError em período fechado ou com contas iguais."""
+    if is_periodo_fechado(emp_id, data): raise ValueError("Período Fechado!")
+    if conta_debito_id == conta_credito_id: raise ValueError("Contas iguais!")
+    with transacao() as conn:
+        inserir_lancamentos(conn, emp_id, [(data, conta_debito_id, conta_credito_id, valor, historico)])
+
+@com_retentativa
+def excluir_lancamento(emp_id, lanc_id):
+    """Remove o lançamento da empresa; levanta ValueError se não existir ou se o mês estiver fechado."""
+    with transacao() as conn:
+        lanc = conn.execute("SELECT data FROM lancamentos WHERE id=? AND empresa_id=?", (lanc_id, emp_id)).fetchone()
+        if not lanc:
+            raise ValueError("Lançamento não encontrado nesta empresa.")
+        if is_periodo_fechado(emp_id, lanc['data']):
+            raise ValueError("Não é possível excluir: Este período contábil já foi encerrado.")
+        conn.execute("DELETE FROM lancamentos WHERE id=? AND empresa_id=?", (lanc_id, emp_id))
+
+def tem_lancamentos(emp_id):
+    with transacao() as conn:
+        return conn.execute("SELECT 1 FROM lancamentos WHERE empresa_id=? LIMIT 1", (emp_id,)).fetchone() is not None
+
+def listar_lancamentos(emp_id, apos=None, limite=LANCAMENTOS_POR_PAGINA, data_ini=None, data_fim=None,
+                       conta_id=None, valor_min=None, valor_max=None, busca=None):
+    """Uma página do razão, do mais recente para o mais antigo, com paginação por chave (data, id).
+
+    `apos` é a chave devolvida pela página anterior; `busca` pesquisa o histórico no índice FTS5.
+    Retorna (df, chave_da_proxima_pagina), com a chave None na última página.
+    """
+    filtro, params = "", [emp_id]
+    if apos: filtro += " AND (data, id) < (?, ?)"; params += list(apos)
+    if data_ini: filtro += " AND data >= ?"; params.append(str(data_ini))
+    if data_fim: filtro += " AND data <= ?"; params.append(str(data_fim))
+    if conta_id: filtro += " AND (conta_debito_id = ? OR conta_credito_id = ?)"; params += [conta_id, conta_id]
+    if valor_min is not None: filtro += " AND valor >= ?"; params.append(valor_min)
+    if valor_max is not None: filtro += " AND valor <= ?"; params.append(valor_max)
+    if busca and busca.strip():
+        # Cada palavra vira um prefixo entre aspas, para que a sintaxe do FTS5 não precise ser escapada
+        termos = " ".join('"' + t.replace('"', '""') + '"*' for t in busca.split())
+        filtro += " AND id IN (SELECT rowid FROM lancamentos_fts WHERE lancamentos_fts MATCH ?)"; params.append(termos)
+    with transacao() as conn:
+        df = pd.read_sql_query(f"""SELECT id, data, conta_debito, conta_credito, valor, historico FROM vw_lancamentos
+                                   WHERE empresa_id=?{filtro} ORDER BY data DESC, id DESC LIMIT ?""", conn, params=params + [limite + 1])
+    if len(df) > limite:
+        df = df.iloc[:limite]
+        return df, (df['data'].iloc[-1], int(df['id'].iloc[-1]))
+    return df, None
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Conferência e reconstrução dos saldos mensais do SysContábil.")
+    acao = ap.add_mutually_exclusive_group(required=True)
+    acao.add_argument("--verificar", action="store_true", help="Lista os saldos que divergem dos lançamentos")
+    acao.add_argument("--reconstruir", action="store_true", help="Recria os saldos mensais e os retratos dos meses fechados")
+    ap.add_argument("--empresa", type=int, help="ID da empresa; padrão: todas")
+    ap.add_argument("--db", default=db.DB_NAME, help="Arquivo do banco")
+    args = ap.parse_args(argv)
+
+    db.DB_NAME = args.db
+    init_db()
+    if args.reconstruir:
+        reconstruir_saldos(args.empresa)
+        print("Saldos reconstruídos.")
+        return
+    divergentes = verificar_saldos(args.empresa)
+    if divergentes.empty:
+        print("Saldos conferem com os lançamentos.")
+        return
+    print(divergentes.to_string(index=False))
+    return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""Leitura de extratos OFX, isolada num módulo importável para rodar em processos separados.
+
+O parsing do ofxtools é CPU-bound; com vários arquivos, cada um é lido em um processo do pool.
+"""
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import pandas as pd
+
+COLUNAS = ['arquivo', 'conta_ofx', 'fitid', 'data', 'valor', 'memo']
+
+def ler_ofx(nome, conteudo):
+    """Transações de um arquivo OFX como tuplas na ordem de COLUNAS."""
+    from ofxtools.Parser import OFXTree
+    parser = OFXTree()
+    parser.parse(io.BytesIO(conteudo))
+    ofx = parser.convert()
+    trans = []
+    for stmt in ofx.statements:
+        acct = stmt.account
+        # Conta do banco no extrato (agência/conta), usada junto com o FITID para detectar repetições
+        conta_ofx = ":".join(str(p) for p in (getattr(acct, 'bankid', None), acct.acctid) if p)
+        for tr in stmt.banktranlist:
+            trans.append((nome, conta_ofx, tr.fitid, tr.dtposted.date().isoformat(), float(tr.trnamt), tr.memo or tr.name))
+    return trans
+
+def ler_ofx_lote(arquivos, processos=None):
+    """Lê vários arquivos [(nome, bytes)] em paralelo e devolve um único DataFrame."""
+    arquivos = list(arquivos)
+    if len(arquivos) <= 1:
+        lidos = [ler_ofx(nome, conteudo) for nome, conteudo in arquivos]
+    else:
+        # spawn evita herdar por fork as threads do servidor do Streamlit
+        with ProcessPoolExecutor(max_workers=min(len(arquivos), processos or os.cpu_count() or 1),
+                                 mp_context=multiprocessing.get_context("spawn")) as pool:
+            lidos = list(pool.map(ler_ofx, *zip(*arquivos)))
+    return pd.DataFrame([t for trans in lidos for t in trans], columns=COLUNAS)
@@ -0,0 +1,70 @@
+"""Períodos contábeis fechados, com os meses trancados de cada empresa em cache na memória.
+
+O cache é carregado uma vez por empresa e invalidado por `fechar_periodo`/`reabrir_periodo`;
+outro processo que altere `fechamentos` diretamente deve chamar `invalidar`.
+"""
+import threading
+import pandas as pd
+from .db import get_db, transacao, com_retentativa
+
+_cache = {}
+_lock = threading.Lock()
+# Incrementada a cada invalidar(): uma leitura que cruzou uma invalidação não guarda o resultado
+_geracao = 0
+
+def meses_fechados(emp_id):
+    """Conjunto (somente leitura) de meses "YYYY-MM" trancados da empresa.
+
+    Só lê (sem `with get_db()`), para não confirmar a transação que o chamador tenha aberta.
+    """
+    meses = _cache.get(emp_id)
+    if meses is None:
+        geracao = _geracao
+        meses = frozenset(r['mes_ano'] for r in get_db().execute("SELECT mes_ano FROM fechamentos WHERE empresa_id=?", (emp_id,)))
+        with _lock:
+            if geracao == _geracao:
+                _cache[emp_id] = meses
+    return meses
+
+def invalidar(emp_id=None):
+    global _geracao
+    with _lock:
+        _geracao += 1
+        if emp_id is None: _cache.clear()
+        else: _cache.pop(emp_id, None)
+
+def is_periodo_fechado(emp_id, data_str):
+    return str(data_str)[:7] in meses_fechados(emp_id)  # YYYY-MM
+
+def mascara_periodo_fechado(emp_id, datas, fechados=None):
+    """Máscara booleana (pd.Series) indicando quais datas caem em mês fechado.
+
+    Aceita datetimes ou textos "YYYY-MM-DD"; datas inválidas (NaT) contam como abertas.
+    `fechados` é o conjunto de meses_fechados já carregado, para uso dentro de uma transação.
+    """
+    datas = pd.Series(datas)
+    if fechados is None:
+        fechados = meses_fechados(emp_id)
+    if pd.api.types.is_datetime64_any_dtype(datas):
+        return (datas.dt.year * 100 + datas.dt.month).isin([int(m[:4]) * 100 + int(m[5:7]) for m in fechados])
+    return datas.astype(str).str[:7].isin(fechados)
+
+@com_retentativa
+def fechar_periodo(emp_id, mes_ano):
+    """Tranca o mês "YYYY-MM" e grava o retrato dos saldos (gatilho em fechamentos); levanta sqlite3.IntegrityError se ele já estiver fechado."""
+    try:
+        with transacao() as conn:
+            conn.execute("INSERT INTO fechamentos (empresa_id, mes_ano) VALUES (?,?)", (emp_id, mes_ano))
+    finally:
+        invalidar(emp_id)
+
+def listar_fechamentos(emp_id):
+    with transacao() as conn:
+        return pd.read_sql_query("SELECT id, mes_ano FROM fechamentos WHERE empresa_id=?", conn, params=(emp_id,))
+
+@com_retentativa
+def reabrir_periodo(emp_id, fechamento_id):
+    """Destranca o mês; o gatilho descarta o retrato de saldos dele."""
+    with transacao() as conn:
+        conn.execute("DELETE FROM fechamentos WHERE id=? AND empresa_id=?", (fechamento_id, emp_id))
+    invalidar(emp_id)
@@ -0,0 +1,141 @@
+"""Renderização de DataFrames em PDF tabular, pensada para relatórios longos (razão, diário).
+
+As linhas são formatadas e escritas em lotes, as colunas são dimensionadas pelo conteúdo e o
+cabeçalho se repete a cada página. O documento final é gravado direto no arquivo de destino.
+
+Depende de detalhes internos do fpdf 1.7 (`buffer`, `state`, `pages`, `_out`), por isso a versão
+fica fixada em fpdf==1.7.2 nos arquivos de requisitos.
+"""
+import io
+import pandas as pd
+from fpdf import FPDF
+
+LOTE_LINHAS = 5000
+ALTURA_LINHA = 5
+FONTE = 7
+# Largura útil (mm) da A4 com margens de 10 mm
+LARGURA_RETRATO, LARGURA_PAISAGEM = 190, 277
+
+class _Destino:
+    """Substitui o `buffer` em memória do FPDF: o fpdf 1.7 monta o documento com `+=` sobre
+    uma única string, o que fica quadrático em relatórios de milhares de páginas."""
+
+    def __init__(self, arquivo):
+        self.arquivo, self.tamanho = arquivo, 0
+
+    def __len__(self):
+        return self.tamanho
+
+    def escrever(self, s):
+        dados = s.encode('latin-1')
+        self.arquivo.write(dados)
+        self.tamanho += len(dados)
+
+class _PDFTabela(FPDF):
+    def __init__(self, titulo, colunas, larguras, alinhamentos, orientacao, arquivo):
+        super().__init__(orientation=orientacao, unit='mm', format='A4')
+        self.titulo, self.colunas, self.larguras, self.alinhamentos = titulo, colunas, larguras, alinhamentos
+        self.buffer = _Destino(arquivo)
+
+    def _out(self, s):
+        if isinstance(s, bytes):
+            s = s.decode('latin-1')
+        elif not isinstance(s, str):
+            s = str(s)
+        if self.state == 2:
+            self.pages[self.page] += s + "\n"
+        else:
+            self.buffer.escrever(s + "\n")
+
+    def header(self):
+        self.set_font("Arial", 'B', 12)
+        self.cell(0, 8, self.titulo, ln=1, align='C')
+        self.set_font("Arial", 'B', FONTE)
+        for col, w in zip(self.colunas, self.larguras):
+            self.cell(w, ALTURA_LINHA + 1, col, border=1, align='C')
+        self.ln()
+        self.set_font("Arial", '', FONTE)
+
+    def lote(self, textos):
+        """Escreve um lote de linhas direto no conteúdo das páginas.
+
+        `cell` por célula custa caro em milhares de linhas: aqui os operadores de texto de cada
+        linha são montados por coluna, e no laço só entra a coordenada vertical.
+        """
+        k, cw, tam = self.k, self.current_font['cw'], self.font_size
+        x, modelos = self.l_margin, ""
+        for t, w, a in zip(textos, self.larguras, self.alinhamentos):
+            if a == 'R':
+                dx = w - self.c_margin - t.map(lambda s: sum(cw.get(c, 0) for c in s)) * tam / 1000
+                pos = ((x + dx) * k).map("{:.2f}".format)
+            else:
+                pos = f"{(x + self.c_margin) * k:.2f}"
+            esc = t.str.replace('\\', '\\\\', regex=False).str.replace('(', '\\(', regex=False).str.replace(')', '\\)', regex=False)
+            modelos = modelos + ("BT " + pos + " \0 Td (" + esc + ") Tj ET ").where(t != "", "")
+            x += w
+        for modelo in modelos.tolist():
+            if self.y + ALTURA_LINHA > self.page_break_trigger:
+                self.add_page()
+            self._out(modelo.replace("\0", f"{(self.h - (self.y + .5 * ALTURA_LINHA + .3 * tam)) * k:.2f}"))
+            self.y += ALTURA_LINHA
+
+    def footer(self):
+        self.set_y(-12)
+        self.set_font("Arial", 'I', FONTE)
+        self.cell(0, 5, f"Página {self.page_no()}/{{nb}}", align='R')
+
+def _texto(s):
+    # As fontes padrão do FPDF só cobrem latin-1; o NUL é reservado aos modelos de linha
+    return s.str.encode('latin-1', errors='replace').str.decode('latin-1').str.replace('\0', ' ', regex=False)
+
+def _formatar(col):
+    """Coluna como textos prontos para a célula; números no padrão 1.234,56."""
+    if pd.api.types.is_float_dtype(col):
+        return col.map(lambda v: "" if pd.isna(v) else f"{v:,.2f}").str.translate(str.maketrans(',.', '.,'))
+    return _texto(col.astype(object).where(col.notna(), "").astype(str))
+
+def _dimensionar(pdf, df, colunas):
+    """Larguras pela célula mais longa de cada coluna, em retrato ou paisagem conforme couber."""
+    pdf.set_font("Arial", '', FONTE)
+    naturais = []
+    for nome, col in zip(colunas, (df[c] for c in df.columns)):
+        if df.empty:
+            amostra = ""
+        elif pd.api.types.is_float_dtype(col):
+            amostra = _formatar(pd.Series([col.max(), col.min()])).str.len().max() * "0"
+        else:
+            txt = col.astype(str)
+            amostra = txt.iloc[txt.str.len().argmax()]
+        naturais.append(max(pdf.get_string_width(str(amostra)), pdf.get_string_width(nome) * 1.15) + 2)
+    total = sum(naturais)
+    orientacao, util = ('P', LARGURA_RETRATO) if total <= LARGURA_RETRATO else ('L', LARGURA_PAISAGEM)
+    escala = util / total if total > util else 1.0
+    return orientacao, [w * escala for w in naturais], escala
+
+def gerar_pdf(df, titulo, destino=None, progresso=None):
+    """Grava df como tabela em PDF no caminho `destino`; sem destino, devolve os bytes.
+
+    `progresso(fracao)` é chamado a cada lote de linhas.
+    """
+    colunas = [str(c) for c in df.columns]
+    orientacao, larguras, escala = _dimensionar(FPDF(), df, colunas)
+    alinhamentos = ['R' if pd.api.types.is_numeric_dtype(df[c]) else 'L' for c in df.columns]
+    arquivo = open(destino, 'wb') if destino else io.BytesIO()
+    try:
+        pdf = _PDFTabela(titulo, colunas, larguras, alinhamentos, orientacao, arquivo)
+        pdf.alias_nb_pages()
+        pdf.set_auto_page_break(True, margin=15)
+        pdf.add_page()
+        for inicio in range(0, len(df), LOTE_LINHAS):
+            lote = df.iloc[inicio:inicio + LOTE_LINHAS]
+            textos = [_formatar(lote[c]) for c in lote.columns]
+            if escala < 1.0:
+                # Colunas comprimidas cortam o texto para não invadir a vizinha
+                textos = [t.str.slice(0, max(int(t.str.len().max() * escala), 1)) if a == 'L' else t
+                          for t, a in zip(textos, alinhamentos)]
+            pdf.lote(textos)
+            if progresso: progresso(min((inicio + LOTE_LINHAS) / len(df), 1.0))
+        pdf.close()
+        return None if destino else arquivo.getvalue()
+    finally:
+        arquivo.close()
@@ -0,0 +1,205 @@
+"""Relatórios contábeis: balancete, DRE/Balanço, razão, diário, indicadores do painel e seus PDFs.
+
+Os resultados por empresa ficam em cache até a próxima escrita nos dados dela (ver cache.py).
+"""
+import os
+import tempfile
+import threading
+import pandas as pd
+from . import cache
+from .cache import versionado
+from .db import transacao
+from .esquema import SQL_SALDOS_ACUMULADOS
+
+def _brutos(conn, emp_id, data_ini, data_fim):
+    """Débito e crédito por conta lidos dos lançamentos entre as duas datas (inclusive).
+
+    Uma leitura só, pela faixa de datas; agrupar em SQL faria o SQLite varrer o índice de contas da empresa inteira.
+    """
+    df = pd.read_sql_query("SELECT conta_debito_id, conta_credito_id, valor FROM lancamentos WHERE empresa_id=? AND data BETWEEN ? AND ?",
+                           conn, params=(emp_id, data_ini, data_fim))
+    return pd.concat([df.groupby('conta_debito_id')['valor'].sum().rename('debito'),
+                      df.groupby('conta_credito_id')['valor'].sum().rename('credito')], axis=1).fillna(0.0).rename_axis('conta_id').reset_index()
+
+def _acumulado(conn, emp_id, ate):
+    return pd.read_sql_query(SQL_SALDOS_ACUMULADOS.format(emp=':emp', ate=':ate'), conn, params={'emp': emp_id, 'ate': ate})
+
+def _meses(conn, emp_id, m_ini, m_fim):
+    """Débito e crédito por conta nos meses inteiros de m_ini a m_fim ("YYYY-MM"; None = sem limite).
+
+    Parte dos retratos dos meses fechados: o acumulado até m_fim menos o acumulado antes de m_ini,
+    quando há retrato dentro do intervalo e perto do início; senão soma os meses de saldos_mensais.
+    """
+    ate = m_fim or '9999-12'
+    if m_ini is None:
+        return _acumulado(conn, emp_id, ate)
+    ant = str(pd.Period(m_ini, 'M') - 1)
+    retrato = "SELECT max(mes) FROM saldos_fechados WHERE empresa_id=? AND mes <= ?"
+    r_ant, r_fim = (conn.execute(retrato, (emp_id, m)).fetchone()[0] for m in (ant, ate))
+    meses = lambda de, a: pd.Period(a, 'M').ordinal - pd.Period(de, 'M').ordinal
+    if r_fim and r_fim >= m_ini and meses(r_ant or '0001-01', ant) < meses(m_ini, r_fim) + 1:
+        df = _acumulado(conn, emp_id, ate).merge(_acumulado(conn, emp_id, ant), on='conta_id', how='left', suffixes=('', '_ant')).fillna(0.0)
+        return df.assign(debito=df['debito'] - df['debito_ant'], credito=df['credito'] - df['credito_ant'])[['conta_id', 'debito', 'credito']]
+    return pd.read_sql_query("""SELECT conta_id, sum(debito) AS debito, sum(credito) AS credito FROM saldos_mensais
+                                WHERE empresa_id=? AND mes BETWEEN ? AND ? GROUP BY conta_id""", conn, params=(emp_id, m_ini, ate))
+
+def _movimento(conn, emp_id, data_ini=None, data_fim=None):
+    """Débito e crédito por conta no período: meses inteiros pelos saldos, as pontas quebradas pelos lançamentos."""
+    ini, fim = (pd.Timestamp(d) if d else None for d in (data_ini, data_fim))
+    if ini is not None and fim is not None and ini > fim:
+        return pd.DataFrame(columns=['conta_id', 'debito', 'credito'])
+    partes, m_ini, m_fim = [], None, None
+    if ini is not None:
+        m_ini = ini.to_period('M')
+        if ini.day != 1:
+            corte = min(fim, m_ini.end_time.normalize()) if fim is not None else m_ini.end_time.normalize()
+            partes.append(_brutos(conn, emp_id, str(ini.date()), str(corte.date())))
+            m_ini += 1
+    if fim is not None:
+        m_fim = fim.to_period('M')
+        if not fim.is_month_end:
+            if m_ini is None or m_fim >= m_ini:
+                partes.append(_brutos(conn, emp_id, str(m_fim.start_time.date()), str(fim.date())))
+            m_fim -= 1
+    if m_ini is None or m_fim is None or m_ini <= m_fim:
+        partes.append(_meses(conn, emp_id, m_ini and str(m_ini), m_fim and str(m_fim)))
+    df = partes[0] if len(partes) == 1 else pd.concat(partes).groupby('conta_id', as_index=False)[['debito', 'credito']].sum()
+    # Os valores são em centavos; a diferença de acumulados não deve deixar resíduo de ponto flutuante
+    return df.round({'debito': 2, 'credito': 2})
+
+@versionado
+def balancete(emp_id, data_ini=None, data_fim=None, nivel=None):
+    """Débito, crédito e saldo de todas as contas da empresa em uma única passada agrupada.
+
+    `nivel` agrupa as contas pelo prefixo do código: 1 -> "1", 2 -> "1.01", 3 -> "1.01.01".
+    Os meses inteiros vêm dos retratos de fechamento e de saldos_mensais; só as pontas fora da
+    virada do mês são lidas dos lançamentos brutos.
+    """
+    with transacao() as conn:
+        df_p = pd.read_sql_query("SELECT id AS conta_id, cod, nome, grupo FROM plano_contas WHERE empresa_id=?", conn, params=(emp_id,))
+        df_m = _movimento(conn, emp_id, data_ini, data_fim)
+
+    df_b = df_p.merge(df_m, on='conta_id', how='left')
+    df_b[['debito', 'credito']] = df_b[['debito', 'credito']].fillna(0.0)
+    # Ativo e Despesa têm natureza devedora; demais grupos, credora
+    devedora = df_b['grupo'].isin(['Ativo', 'Despesa'])
+    df_b['saldo'] = (df_b['debito'] - df_b['credito']).where(devedora, df_b['credito'] - df_b['debito'])
+
+    if nivel:
+        nomes = dict(zip(df_b['cod'], df_b['nome']))
+        df_b['cod'] = df_b['cod'].str.split('.').str[:nivel].str.join('.')
+        df_b = df_b.groupby('cod', as_index=False, sort=True).agg(
+            grupo=('grupo', 'first'), debito=('debito', 'sum'), credito=('credito', 'sum'), saldo=('saldo', 'sum'))
+        df_b.insert(1, 'nome', df_b['cod'].map(nomes).fillna(df_b['cod']))
+    return df_b[['cod', 'nome', 'grupo', 'debito', 'credito', 'saldo']]
+
+@versionado
+def faturamento_12m(emp_id):
+    """Receita creditada por mês nos últimos 12 meses com movimento, indexada por "MM/AAAA"."""
+    with transacao() as conn:
+        fat = pd.read_sql_query("""SELECT s.mes, sum(s.credito) AS valor FROM saldos_mensais s JOIN plano_contas p ON p.id = s.conta_id
+                                   WHERE s.empresa_id=? AND p.grupo = 'Receita' GROUP BY s.mes ORDER BY s.mes DESC LIMIT 12""", conn, params=(emp_id,))
+    fat = fat.iloc[::-1]
+    return fat.set_index(pd.to_datetime(fat['mes']).dt.strftime('%m/%Y'))['valor']
+
+@versionado
+def metricas_dashboard(emp_id):
+    """(receitas, despesas): créditos no grupo 4 e débitos no grupo 5."""
+    with transacao() as conn:
+        rec, des = conn.execute(f"""SELECT sum(CASE WHEN p.cod >= '4' AND p.cod < '5' THEN s.credito END), sum(CASE WHEN p.cod >= '5' AND p.cod < '6' THEN s.debito END)
+                                    FROM ({SQL_SALDOS_ACUMULADOS.format(emp=':emp', ate="'9999-12'")}) s JOIN plano_contas p ON p.id = s.conta_id""", {'emp': emp_id}).fetchone()
+    return rec or 0, des or 0
+
+@versionado
+def evolucao_diaria(emp_id):
+    with transacao() as conn:
+        df = pd.read_sql_query("SELECT data, sum(valor) AS valor FROM lancamentos WHERE empresa_id=? GROUP BY data", conn, params=(emp_id,))
+    return df.set_index(pd.to_datetime(df['data']))['valor']
+
+def diario(emp_id, data_ini=None, data_fim=None):
+    """Livro diário: os lançamentos do período em ordem cronológica."""
+    filtro, params = "", [emp_id]
+    if data_ini: filtro += " AND data >= ?"; params.append(str(data_ini))
+    if data_fim: filtro += " AND data <= ?"; params.append(str(data_fim))
+    with transacao() as conn:
+        return pd.read_sql_query(f"""SELECT data, id, conta_debito, conta_credito, valor, historico FROM vw_lancamentos
+                                     WHERE empresa_id=?{filtro} ORDER BY data, id""", conn, params=params)
+
+def razao(emp_id, data_ini=None, data_fim=None, conta_id=None):
+    """Livro razão: o movimento de cada conta com a contrapartida e o saldo acumulado.
+
+    O saldo parte do acumulado antes de `data_ini` e segue a natureza do grupo da conta.
+    """
+    filtro, params = "", [emp_id]
+    if data_ini: filtro += " AND data >= ?"; params.append(str(data_ini))
+    if data_fim: filtro += " AND data <= ?"; params.append(str(data_fim))
+    f_conta = " AND {} = ?" if conta_id else ""
+    p_conta = [conta_id] if conta_id else []
+    with transacao() as conn:
+        df_p = pd.read_sql_query("SELECT id AS conta_id, cod, nome, grupo FROM plano_contas WHERE empresa_id=?", conn, params=(emp_id,))
+        df = pd.read_sql_query(f"""
+            SELECT conta_debito_id AS conta_id, data, id, conta_credito AS contrapartida, historico, valor AS debito, 0.0 AS credito
+            FROM vw_lancamentos WHERE empresa_id=?{filtro}{f_conta.format('conta_debito_id')}
+            UNION ALL
+            SELECT conta_credito_id, data, id, conta_debito, historico, 0.0, valor
+            FROM vw_lancamentos WHERE empresa_id=?{filtro}{f_conta.format('conta_credito_id')}""", conn, params=(params + p_conta) * 2)
+        if data_ini:
+            ant = _movimento(conn, emp_id, data_fim=pd.Timestamp(data_ini) - pd.Timedelta(days=1))
+            if conta_id: ant = ant[ant['conta_id'] == conta_id]
+        else:
+            ant = pd.DataFrame(columns=['conta_id', 'debito', 'credito'])
+
+    df = df.merge(df_p, on='conta_id').sort_values(['cod', 'data', 'id'], kind='stable', ignore_index=True)
+    devedora = df['grupo'].isin(['Ativo', 'Despesa'])
+    df['saldo'] = (df['debito'] - df['credito']).where(devedora, df['credito'] - df['debito'])
+    ant = ant.merge(df_p, on='conta_id')
+    abertura = (ant['debito'] - ant['credito']).where(ant['grupo'].isin(['Ativo', 'Despesa']), ant['credito'] - ant['debito'])
+    df['saldo'] = df.groupby('conta_id')['saldo'].cumsum() + df['conta_id'].map(dict(zip(ant['conta_id'], abertura))).fillna(0.0)
+    df['conta'] = df['cod'] + " - " + df['nome']
+    return df[['conta', 'data', 'id', 'contrapartida', 'historico', 'debito', 'credito', 'saldo']]
+
+_TITULOS_PDF = {'dre': "DRE", 'balanco': "Balanço Patrimonial", 'razao': "Livro Razão", 'diario': "Livro Diário"}
+
+def pdf_relatorio(emp_id, tipo, data_ini=None, data_fim=None, conta_id=None, progresso=None):
+    """Caminho do PDF do relatório (dre, balanco, razao ou diario), gerado direto em disco.
+
+    O nome do arquivo leva a versão dos dados da empresa: enquanto ela não muda, o PDF já gerado é
+    reaproveitado; ao mudar, os arquivos das versões anteriores são apagados. `progresso` segue para gerar_pdf.
+    """
+    pasta = os.path.join(tempfile.gettempdir(), "syscontabil_pdf")
+    prefixo = f"{emp_id}_{cache.versao_dados(emp_id)}_"
+    caminho = os.path.join(pasta, f"{prefixo}{tipo}_{data_ini}_{data_fim}_{conta_id}.pdf")
+    if os.path.exists(caminho):
+        return caminho
+
+    if tipo in ('dre', 'balanco'):
+        grupos = ['Receita', 'Despesa'] if tipo == 'dre' else ['Ativo', 'Passivo', 'Patrimônio Líquido']
+        df_s = balancete(emp_id, data_ini, data_fim)
+        df = df_s[df_s['grupo'].isin(grupos)][['cod', 'nome', 'grupo', 'saldo']]
+        df.columns = ['Código', 'Conta', 'Grupo', 'Saldo']
+    elif tipo == 'razao':
+        df = razao(emp_id, data_ini, data_fim, conta_id)
+        df.columns = ['Conta', 'Data', 'Nº', 'Contrapartida', 'Histórico', 'Débito', 'Crédito', 'Saldo']
+    else:
+        df = diario(emp_id, data_ini, data_fim)
+        df.columns = ['Data', 'Nº', 'Débito', 'Crédito', 'Valor', 'Histórico']
+    titulo = _TITULOS_PDF[tipo]
+    if data_ini or data_fim:
+        titulo += f" - {data_ini or '...'} a {data_fim or '...'}"
+
+    from .relatorio_pdf import gerar_pdf
+    os.makedirs(pasta, exist_ok=True)
+    for nome in os.listdir(pasta):
+        if nome.startswith(f"{emp_id}_") and not nome.startswith(prefixo):
+            try: os.remove(os.path.join(pasta, nome))
+            except OSError: pass
+    # Grava num nome provisório para que uma leitura concorrente nunca pegue o arquivo pela metade
+    provisorio = f"{caminho}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        gerar_pdf(df, titulo, provisorio, progresso)
+        os.replace(provisorio, caminho)
+    except BaseException:
+        # Geração interrompida (erro ou cancelamento) não deixa o provisório para trás
+        if os.path.exists(provisorio): os.remove(provisorio)
+        raise
+    return caminho
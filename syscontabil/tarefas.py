@@ -0,0 +1,266 @@
+"""Fila de tarefas em segundo plano: importações, provisões fiscais e PDFs fora da execução do script.
+
+A fila fica num arquivo SQLite ao lado do banco principal (`<banco>_tarefas.db`): uma importação
+segura a escrita do banco principal até o commit, e enfileirar, registrar progresso ou cancelar
+não podem esperar por ela. Quem confirma que uma execução de uma tarefa de escrita gravou é a
+tabela tarefas_confirmadas do banco principal, preenchida na mesma transação dos dados.
+
+- Idempotência: a chave é o hash do tipo, da empresa, dos parâmetros e da entrada. Enquanto a tarefa
+  está na fila ou em execução, enfileirar de novo devolve a existente. Concluída, uma tarefa de
+  escrita roda de novo numa nova execução (ex.: reimportar o arquivo depois de excluir os
+  lançamentos); um PDF concluído é reaproveitado enquanto os dados da empresa não mudam.
+- Cancelamento: marcado na fila e atendido no próximo ponto de progresso, que levanta
+  TarefaCancelada e desfaz a transação em curso.
+- Retomada: `iniciar` conclui as tarefas interrompidas que chegaram a confirmar e devolve à
+  fila as demais, que o SQLite já desfez. Supõe um único processo executor (o servidor do app).
+"""
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import pandas as pd
+from . import cache, db, fiscal
+from .db import transacao
+
+TRABALHADORES = min(os.cpu_count() or 1, 4)
+ATIVAS = ('pendente', 'executando')
+
+_SQL_TABELA = """CREATE TABLE IF NOT EXISTS tarefas (id INTEGER PRIMARY KEY AUTOINCREMENT, chave TEXT UNIQUE, tipo TEXT,
+    usuario_id INTEGER, empresa_id INTEGER, parametros TEXT, entrada BLOB, situacao TEXT DEFAULT 'pendente',
+    progresso REAL DEFAULT 0, mensagem TEXT, resultado TEXT, cancelar INTEGER DEFAULT 0, tentativas INTEGER DEFAULT 0, execucao INTEGER DEFAULT 0,
+    criada_em TEXT DEFAULT CURRENT_TIMESTAMP, iniciada_em TEXT, concluida_em TEXT)"""
+
+class TarefaCancelada(Exception):
+    pass
+
+_TIPOS = {}
+_local = threading.local()
+_lock = threading.Lock()
+_threads = None
+# O SQLite tem um único escritor: tarefas de escrita esperam na fila da sua thread, sem ocupar as de leitura
+_escritor = None
+_processos = None
+_iniciada = False
+
+def tarefa(tipo, escrita=False, processo=False, versionada=False):
+    """Registra fn(emp_id, parametros, entrada, progresso, ao_confirmar) -> resultado (JSON) como executor de `tipo`.
+
+    `processo` roda num processo à parte (trabalho CPU-bound que não grava no banco); `versionada`
+    põe a versão dos dados da empresa na chave, para resultados que dependem deles, como PDFs.
+    """
+    def registrar(fn):
+        _TIPOS[tipo] = {'fn': fn, 'escrita': escrita, 'processo': processo, 'versionada': versionada}
+        return fn
+    return registrar
+
+def _fila():
+    """Conexão da thread atual com o arquivo da fila, que acompanha db.DB_NAME."""
+    caminho = os.path.splitext(db.DB_NAME)[0] + "_tarefas.db"
+    if getattr(_local, 'caminho', None) != caminho:
+        if getattr(_local, 'conn', None) is not None:
+            _local.conn.close()
+        _local.conn, _local.caminho = db.abrir_conexao(caminho), caminho
+        _local.conn.execute(_SQL_TABELA)
+        _local.conn.execute("CREATE INDEX IF NOT EXISTS idx_tarefas_usuario ON tarefas (usuario_id, id)")
+    return _local.conn
+
+def _df_json(df):
+    return json.loads(df.to_json(orient='split', index=False))
+
+# --- Executores ---
+@tarefa('importar_csv', escrita=True)
+def _importar_csv(emp_id, parametros, entrada, progresso, ao_confirmar):
+    from .importacao import importar_csv
+    aceitos, df_rej = importar_csv(emp_id, io.BytesIO(entrada), progresso=lambda f, a, r: progresso(f, f"{a} aceito(s), {r} rejeitado(s)"),
+                                   ao_confirmar=ao_confirmar)
+    return {'aceitos': aceitos, 'rejeitados': len(df_rej), 'motivos': df_rej['motivo'].value_counts().to_dict(),
+            'amostra': _df_json(df_rej.head(1000))}
+
+@tarefa('importar_ofx', escrita=True)
+def _importar_ofx(emp_id, parametros, entrada, progresso, ao_confirmar):
+    from .importacao import importar_ofx
+    df = pd.read_json(io.BytesIO(entrada), orient='split', dtype=False)
+    gravados, repetidos, fechados = importar_ofx(emp_id, df, parametros['conta_banco_id'], ao_confirmar=ao_confirmar)
+    return {'gravados': gravados, 'repetidos': repetidos, 'fechados': fechados}
+
+@tarefa('provisionar', escrita=True)
+def _provisionar(emp_id, parametros, entrada, progresso, ao_confirmar):
+    df = fiscal.apurar(parametros['empresas'], parametros['de'], parametros['ate'], **parametros.get('opcoes', {}))
+    progresso(0.5, f"{len(df)} tributo(s) apurado(s); lançando provisões...")
+    return {'resumo': _df_json(fiscal.provisionar(df, ao_confirmar=ao_confirmar))}
+
+@tarefa('pdf', processo=True, versionada=True)
+def _pdf(emp_id, parametros, entrada, progresso, ao_confirmar):
+    from .relatorios import pdf_relatorio
+    p = parametros
+    return {'caminho': pdf_relatorio(emp_id, p['tipo'], p.get('data_ini'), p.get('data_fim'), p.get('conta_id'), progresso=progresso)}
+
+# --- Execução ---
+def _progresso(tarefa_id):
+    """Callback que grava o progresso na fila e levanta TarefaCancelada se o cancelamento foi pedido."""
+    def progresso(fracao, mensagem=None):
+        with _fila() as f:
+            f.execute("UPDATE tarefas SET progresso = ?, mensagem = coalesce(?, mensagem) WHERE id = ?", (fracao, mensagem, tarefa_id))
+            if f.execute("SELECT cancelar FROM tarefas WHERE id = ?", (tarefa_id,)).fetchone()[0]:
+                raise TarefaCancelada()
+    return progresso
+
+def _rodar(db_name, tarefa_id, tipo, emp_id, parametros, entrada, ao_confirmar=None):
+    """Executa a tarefa; roda tanto numa thread do app quanto num processo do pool."""
+    if db.DB_NAME != db_name:
+        db.DB_NAME = db_name
+        db.fechar()
+    progresso = _progresso(tarefa_id)
+    progresso(0.0, "Em execução...")
+    return _TIPOS[tipo]['fn'](emp_id, parametros, entrada, progresso, ao_confirmar)
+
+def _finalizar(tarefa_id, situacao, mensagem=None, resultado=None):
+    # A entrada só é descartada na conclusão: falhas e cancelamentos podem ser enfileirados de novo.
+    # A mensagem de progresso ("Em execução...") é sempre substituída, mesmo sem mensagem final.
+    with _fila() as f:
+        f.execute("""UPDATE tarefas SET situacao = :sit, mensagem = :msg, resultado = :res, concluida_em = CURRENT_TIMESTAMP,
+                     progresso = CASE WHEN :sit = 'concluida' THEN 1 ELSE progresso END,
+                     entrada = CASE WHEN :sit = 'concluida' THEN NULL ELSE entrada END WHERE id = :id""",
+                  {'sit': situacao, 'msg': mensagem, 'res': json.dumps(resultado) if resultado is not None else None, 'id': tarefa_id})
+
+def _chave_execucao(t):
+    """Chave em tarefas_confirmadas: a da tarefa mais o número da execução, que só muda ao rodá-la de novo depois de concluída."""
+    return f"{t['chave']}#{t['execucao']}"
+
+def _confirmada(chave_execucao):
+    with transacao() as conn:
+        return conn.execute("SELECT 1 FROM tarefas_confirmadas WHERE chave = ?", (chave_execucao,)).fetchone() is not None
+
+def _executar(tarefa_id):
+    try:
+        with _fila() as f:
+            # A reivindicação condicional impede que a mesma tarefa rode duas vezes
+            if f.execute("UPDATE tarefas SET situacao = 'executando', iniciada_em = CURRENT_TIMESTAMP, tentativas = tentativas + 1 WHERE id = ? AND situacao = 'pendente'",
+                         (tarefa_id,)).rowcount == 0:
+                return
+            t = f.execute("SELECT chave, execucao, tipo, empresa_id, parametros, entrada FROM tarefas WHERE id = ?", (tarefa_id,)).fetchone()
+        tipo = _TIPOS[t['tipo']]
+        args = (db.DB_NAME, tarefa_id, t['tipo'], t['empresa_id'], json.loads(t['parametros']), t['entrada'])
+        if tipo['processo']:
+            resultado = _pool_processos().submit(_rodar, *args).result()
+        elif tipo['escrita']:
+            def ao_confirmar(conn):
+                conn.execute("INSERT INTO tarefas_confirmadas (chave, tarefa_id) VALUES (?, ?)", (_chave_execucao(t), tarefa_id))
+            # Cobre uma fila restaurada de backup: o banco principal sabe o que esta execução já gravou
+            if _confirmada(_chave_execucao(t)):
+                return _finalizar(tarefa_id, 'concluida', "Já gravada por uma execução anterior.")
+            resultado = _rodar(*args, ao_confirmar=ao_confirmar)
+        else:
+            resultado = _rodar(*args)
+        _finalizar(tarefa_id, 'concluida', resultado=resultado)
+    except TarefaCancelada:
+        _finalizar(tarefa_id, 'cancelada', "Cancelada; nada foi gravado.")
+    except Exception as e:
+        _finalizar(tarefa_id, 'falhou', str(e) or type(e).__name__)
+    finally:
+        db.fechar()
+
+def _pool_processos():
+    global _processos
+    with _lock:
+        if _processos is None:
+            # spawn evita herdar por fork as threads do servidor do Streamlit
+            _processos = ProcessPoolExecutor(max_workers=TRABALHADORES, mp_context=multiprocessing.get_context("spawn"))
+        return _processos
+
+def _despachar(tarefa_id, tipo):
+    """Tarefas de escrita vão para a thread única de gravação, na ordem; as demais, para o pool."""
+    global _threads, _escritor
+    with _lock:
+        if _TIPOS[tipo]['escrita']:
+            if _escritor is None:
+                _escritor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tarefa-escrita")
+            _escritor.submit(_executar, tarefa_id)
+        else:
+            if _threads is None:
+                _threads = ThreadPoolExecutor(max_workers=TRABALHADORES, thread_name_prefix="tarefa")
+            _threads.submit(_executar, tarefa_id)
+
+def iniciar():
+    """Sobe a fila neste processo e retoma as tarefas deixadas por uma execução interrompida; chamadas seguintes não fazem nada."""
+    global _iniciada
+    with _lock:
+        if _iniciada:
+            return
+        _iniciada = True
+    with _fila() as f:
+        presas = f.execute("SELECT id, chave, execucao, cancelar FROM tarefas WHERE situacao = 'executando'").fetchall()
+    for t in presas:
+        if _confirmada(_chave_execucao(t)):
+            _finalizar(t['id'], 'concluida', "Gravada antes da interrupção; o resumo não foi registrado.")
+        elif t['cancelar']:
+            _finalizar(t['id'], 'cancelada', "Cancelada; nada foi gravado.")
+        else:
+            with _fila() as f:
+                f.execute("UPDATE tarefas SET situacao = 'pendente', progresso = 0 WHERE id = ?", (t['id'],))
+    with _fila() as f:
+        pendentes = f.execute("SELECT id, tipo FROM tarefas WHERE situacao = 'pendente' ORDER BY id").fetchall()
+    for t in pendentes:
+        _despachar(t['id'], t['tipo'])
+
+def enfileirar(usuario_id, emp_id, tipo, parametros=None, entrada=None):
+    """Põe a tarefa na fila e devolve o id.
+
+    A mesma tarefa (mesma chave) pendente ou em execução é devolvida sem rodar de novo, assim como um
+    PDF já concluído; nos demais casos ela volta para a fila, e uma gravação concluída ganha uma
+    nova execução, para que a confirmação da anterior não a dê como já gravada.
+    """
+    parametros = parametros or {}
+    h = hashlib.sha256(json.dumps([tipo, emp_id, parametros], sort_keys=True).encode())
+    if entrada is not None: h.update(entrada)
+    if _TIPOS[tipo]['versionada']: h.update(f"v{cache.versao_dados(emp_id)}".encode())
+    chave = h.hexdigest()
+    with _fila() as f:
+        row = f.execute("SELECT id, situacao FROM tarefas WHERE chave = ?", (chave,)).fetchone()
+        if row is None:
+            tarefa_id = f.execute("INSERT INTO tarefas (chave, tipo, usuario_id, empresa_id, parametros, entrada) VALUES (?, ?, ?, ?, ?, ?)",
+                                  (chave, tipo, usuario_id, emp_id, json.dumps(parametros), entrada)).lastrowid
+        elif row['situacao'] in ATIVAS or (row['situacao'] == 'concluida' and not _TIPOS[tipo]['escrita']):
+            return row['id']
+        else:
+            tarefa_id = row['id']
+            # A entrada de uma tarefa concluída já foi descartada; a desta chamada é a mesma, pela chave
+            f.execute("""UPDATE tarefas SET situacao = 'pendente', progresso = 0, mensagem = NULL, resultado = NULL, cancelar = 0, entrada = ?,
+                         execucao = execucao + (situacao = 'concluida'), usuario_id = ?,
+                         criada_em = CURRENT_TIMESTAMP, iniciada_em = NULL, concluida_em = NULL WHERE id = ?""", (entrada, usuario_id, tarefa_id))
+    _despachar(tarefa_id, tipo)
+    return tarefa_id
+
+def cancelar(tarefa_id):
+    """Cancela na hora uma tarefa pendente; uma em execução para no próximo ponto de progresso."""
+    with _fila() as f:
+        if not f.execute("UPDATE tarefas SET situacao = 'cancelada', mensagem = 'Cancelada antes de começar.', concluida_em = CURRENT_TIMESTAMP WHERE id = ? AND situacao = 'pendente'",
+                         (tarefa_id,)).rowcount:
+            f.execute("UPDATE tarefas SET cancelar = 1, mensagem = 'Cancelando...' WHERE id = ? AND situacao = 'executando'", (tarefa_id,))
+
+_SQL_CONSULTA = """SELECT id, tipo, usuario_id, empresa_id, parametros, situacao, progresso, mensagem, resultado,
+    criada_em, iniciada_em, concluida_em FROM tarefas"""
+
+def _decodificar(row):
+    t = dict(row)
+    t['parametros'] = json.loads(t['parametros'])
+    t['resultado'] = json.loads(t['resultado']) if t['resultado'] else None
+    return t
+
+def consultar(tarefa_id):
+    """A tarefa como dict (sem a entrada), com parâmetros e resultado já decodificados; None se não existir."""
+    with _fila() as f:
+        row = f.execute(f"{_SQL_CONSULTA} WHERE id = ?", (tarefa_id,)).fetchone()
+    return _decodificar(row) if row else None
+
+def listar(usuario_id, tipos=None, limite=10):
+    """As tarefas mais recentes do usuário (opcionalmente só dos tipos informados), da mais nova para a mais antiga."""
+    filtro, params = "", [usuario_id]
+    if tipos:
+        filtro = f" AND tipo IN ({','.join('?' * len(tipos))})"; params += list(tipos)
+    with _fila() as f:
+        rows = f.execute(f"{_SQL_CONSULTA} WHERE usuario_id = ?{filtro} ORDER BY id DESC LIMIT ?", params + [limite]).fetchall()
+    return [_decodificar(r) for r in rows]
@@ -0,0 +1,24 @@
+"""Usuários (login e cadastro) e as empresas de cada um."""
+from .db import transacao, com_retentativa
+
+def autenticar(username, senha):
+    """Id do usuário se a senha confere, senão None."""
+    from werkzeug.security import check_password_hash
+    with transacao() as conn:
+        user = conn.execute('SELECT id, password FROM usuarios WHERE username = ?', (username,)).fetchone()
+    return user['id'] if user and check_password_hash(user['password'], senha) else None
+
+@com_retentativa
+def criar_usuario(username, senha, nome_completo):
+    from werkzeug.security import generate_password_hash
+    with transacao() as conn:
+        conn.execute('INSERT INTO usuarios (username, password, nome_completo) VALUES (?,?,?)', (username, generate_password_hash(senha), nome_completo))
+
+def empresas_do_usuario(usuario_id):
+    with transacao() as conn:
+        return conn.execute('SELECT * FROM empresas WHERE usuario_id = ?', (usuario_id,)).fetchall()
+
+@com_retentativa
+def criar_empresa(usuario_id, nome, cnpj, regime):
+    with transacao() as conn:
+        conn.execute('INSERT INTO empresas (nome, cnpj, regime, usuario_id) VALUES (?,?,?,?)', (nome, cnpj, regime, usuario_id))
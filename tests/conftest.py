@@ -0,0 +1,27 @@
+import pytest
+from syscontabil import db, periodos
+from syscontabil.contas import importar_plano_padrao
+from syscontabil.esquema import init_db
+
+@pytest.fixture
+def db_temp(tmp_path, monkeypatch):
+    """Aponta db.DB_NAME para um arquivo novo, ainda sem esquema."""
+    monkeypatch.setattr(db, 'DB_NAME', str(tmp_path / "teste.db"))
+    db.fechar()
+    periodos.invalidar()
+    yield db.DB_NAME
+    db.fechar()
+    periodos.invalidar()
+
+@pytest.fixture
+def banco(db_temp):
+    init_db()
+    return db_temp
+
+@pytest.fixture
+def emp_id(banco):
+    """Empresa do Simples Nacional com o plano padrão."""
+    with db.transacao() as conn:
+        emp = conn.execute("INSERT INTO empresas (nome, regime, usuario_id) VALUES ('Teste', 'Simples Nacional', 1)").lastrowid
+    importar_plano_padrao(emp)
+    return emp
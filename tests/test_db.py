@@ -0,0 +1,61 @@
+import gc
+import threading
+import pytest
+from syscontabil import db
+
+@pytest.fixture
+def conn(db_temp):
+    conn = db.get_db()
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    return conn
+
+def test_transacao_aninhada_nao_confirma_a_de_fora(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("INSERT INTO t VALUES (1)")
+    with db.transacao():
+        conn.execute("INSERT INTO t VALUES (2)")
+    with pytest.raises(ValueError):
+        with db.transacao():
+            conn.execute("INSERT INTO t VALUES (3)")
+            raise ValueError
+    assert conn.in_transaction
+    assert [r[0] for r in conn.execute("SELECT x FROM t ORDER BY x")] == [1, 2]
+    conn.rollback()
+    assert conn.execute("SELECT count(*) FROM t").fetchone()[0] == 0
+
+def test_consultas_da_rodada_sao_por_thread(conn):
+    db.iniciar_rodada()
+    conn.execute("SELECT 1")
+    t = threading.Thread(target=lambda: (db.iniciar_rodada(), db.get_db().execute("SELECT 1"), db.fechar()))
+    t.start(); t.join()
+    assert db.estatisticas()['consultas_rodada'] == 1
+
+def test_conexao_da_sessao_fecha_com_o_estado(conn):
+    abertas = db.estatisticas()['conexoes_abertas']
+    estado = {}
+    sessao = db.conexao_da_sessao(estado)
+    assert db.conexao_da_sessao(estado) is sessao
+    del estado
+    gc.collect()
+    assert db.estatisticas()['conexoes_abertas'] == abertas
+    with pytest.raises(Exception):
+        sessao.execute("SELECT 1")
+
+def test_escrita_com_banco_travado_vira_banco_ocupado(emp_id, monkeypatch):
+    from syscontabil.contas import conta_por_codigo
+    from syscontabil.lancamentos import lancar
+    monkeypatch.setattr(db, 'BUSY_TIMEOUT_MS', 50)
+    monkeypatch.setattr(db, 'PRAGMAS', [p for p in db.PRAGMAS if 'busy_timeout' not in p] + ["PRAGMA busy_timeout = 50"])
+    monkeypatch.setattr(db, 'TENTATIVAS', 2)
+    db.fechar()
+    # Outra conexão segura a escrita, como uma importação em andamento
+    importacao = db.abrir_conexao()
+    importacao.execute("BEGIN IMMEDIATE")
+    retentativas = db.estatisticas()['retentativas']
+    try:
+        with pytest.raises(db.BancoOcupado):
+            lancar(emp_id, "2025-01-10", conta_por_codigo(emp_id, "1.01.01"), conta_por_codigo(emp_id, "4.01.01"), 10.0, "manual")
+    finally:
+        importacao.rollback()
+        db.fechar_conexao(importacao)
+    assert db.estatisticas()['retentativas'] == retentativas + 1
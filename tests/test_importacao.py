@@ -0,0 +1,75 @@
+import io
+import pytest
+from syscontabil import db, periodos
+from syscontabil.contas import conta_por_codigo
+from syscontabil.importacao import importar_csv
+from syscontabil.lancamentos import lancar, verificar_saldos
+from syscontabil.cache import versao_dados
+
+def _csv(linhas):
+    return io.BytesIO(("data,conta_debito,conta_credito,valor,historico\n" + "".join(
+        f"2025-01-{d:02d},1.01.01,4.01.01,{d}.00,venda {d}\n" for d in range(1, linhas + 1))).encode())
+
+def test_importacao_que_falha_nao_deixa_marca_em_saldos_adiados(emp_id):
+    def falhar(*_):
+        raise RuntimeError("falha no meio da importação")
+    # Cache de meses fechados frio: a consulta dele não pode confirmar a transação da importação
+    periodos.invalidar()
+    with pytest.raises(RuntimeError):
+        importar_csv(emp_id, _csv(4), tamanho_lote=2, progresso=falhar)
+    conn = db.get_db()
+    assert conn.execute("SELECT count(*) FROM saldos_adiados").fetchone()[0] == 0
+    assert conn.execute("SELECT count(*) FROM lancamentos").fetchone()[0] == 0
+
+    versao = versao_dados(emp_id)
+    lancar(emp_id, "2025-02-01", conta_por_codigo(emp_id, "1.01.01"), conta_por_codigo(emp_id, "4.01.01"), 10.0, "manual")
+    assert verificar_saldos(emp_id).empty
+    assert versao_dados(emp_id) > versao
+
+def test_importacao_respeita_mes_fechado(emp_id):
+    periodos.fechar_periodo(emp_id, "2025-01")
+    periodos.invalidar()
+    aceitos, rejeitados = importar_csv(emp_id, _csv(3), tamanho_lote=2)
+    assert aceitos == 0
+    assert set(rejeitados['motivo']) == {"Período fechado"}
+
+def _ofx(conta, transacoes):
+    linhas = "".join(f"<STMTTRN><TRNTYPE>OTHER<DTPOSTED>{d.replace('-', '')}120000<TRNAMT>{v}<FITID>{f}<MEMO>{m}</STMTTRN>" for d, v, f, m in transacoes)
+    return f"""OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+SECURITY:NONE
+ENCODING:USASCII
+CHARSET:1252
+COMPRESSION:NONE
+OLDFILEUID:NONE
+NEWFILEUID:NONE
+
+<OFX><SIGNONMSGSRSV1><SONRS><STATUS><CODE>0<SEVERITY>INFO</STATUS><DTSERVER>20250131120000<LANGUAGE>POR</SONRS></SIGNONMSGSRSV1>
+<BANKMSGSRSV1><STMTTRNRS><TRNUID>1<STATUS><CODE>0<SEVERITY>INFO</STATUS><STMTRS><CURDEF>BRL<BANKACCTFROM><BANKID>341<ACCTID>{conta}<ACCTTYPE>CHECKING</BANKACCTFROM>
+<BANKTRANLIST><DTSTART>20250101<DTEND>20250228{linhas}</BANKTRANLIST><LEDGERBAL><BALAMT>0<DTASOF>20250228</LEDGERBAL></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+""".encode()
+
+def test_ofx_descarta_transacoes_ja_importadas_pelo_fitid(emp_id):
+    from syscontabil.importacao import importar_ofx
+    from syscontabil.leitor_ofx import ler_ofx_lote
+    banco = conta_por_codigo(emp_id, "1.01.02")
+    janeiro = _ofx("123", [("2025-01-05", "100.00", "A1", "Deposito"), ("2025-01-06", "-40.00", "A2", "Tarifa")])
+    # Extrato sobreposto: repete A2 e traz A3; a mesma conta e FITID em outra conta do banco é outra transação
+    sobreposto = _ofx("123", [("2025-01-06", "-40.00", "A2", "Tarifa"), ("2025-01-07", "15.00", "A3", "Pix")])
+    outra_conta = _ofx("999", [("2025-01-05", "100.00", "A1", "Deposito")])
+
+    assert importar_ofx(emp_id, ler_ofx_lote([("jan.ofx", janeiro)]), banco) == (2, 0, 0)
+    df = ler_ofx_lote([("jan.ofx", janeiro), ("sobreposto.ofx", sobreposto), ("outra.ofx", outra_conta)])
+    assert importar_ofx(emp_id, df, banco) == (2, 3, 0)
+
+    conn = db.get_db()
+    assert conn.execute("SELECT count(*) FROM lancamentos").fetchone()[0] == 4
+    assert verificar_saldos(emp_id).empty
+
+def test_ofx_ignora_periodo_fechado(emp_id):
+    from syscontabil.importacao import importar_ofx
+    from syscontabil.leitor_ofx import ler_ofx_lote
+    periodos.fechar_periodo(emp_id, "2025-01")
+    extrato = _ofx("123", [("2025-01-05", "100.00", "B1", "Deposito"), ("2025-02-03", "20.00", "B2", "Pix")])
+    assert importar_ofx(emp_id, ler_ofx_lote([("ext.ofx", extrato)]), conta_por_codigo(emp_id, "1.01.02")) == (1, 0, 1)
@@ -0,0 +1,48 @@
+import pytest
+from syscontabil import db
+from syscontabil.contas import conta_por_codigo
+from syscontabil.lancamentos import inserir_lancamentos, listar_lancamentos
+
+@pytest.fixture
+def razao(emp_id):
+    """23 lançamentos em 5 datas, com várias linhas por data para exercitar o desempate por id."""
+    caixa, receita = conta_por_codigo(emp_id, "1.01.01"), conta_por_codigo(emp_id, "4.01.01")
+    historicos = ["Venda balcão", "Serviço de manutenção", "Venda à vista"]
+    with db.transacao() as conn:
+        inserir_lancamentos(conn, emp_id, [(f"2025-01-{1 + i % 5:02d}", caixa, receita, float(i + 1), historicos[i % 3]) for i in range(23)])
+    return emp_id
+
+def _todas_as_paginas(emp_id, **filtros):
+    paginas, apos = [], None
+    while True:
+        df, apos = listar_lancamentos(emp_id, apos=apos, limite=5, **filtros)
+        paginas.append(df)
+        if apos is None:
+            return paginas
+
+def test_paginacao_por_chave_percorre_tudo_uma_vez_em_ordem(razao):
+    paginas = _todas_as_paginas(razao)
+    assert [len(p) for p in paginas] == [5, 5, 5, 5, 3]
+    chaves = [(d, i) for p in paginas for d, i in zip(p['data'], p['id'])]
+    assert chaves == sorted(chaves, reverse=True)
+    assert len(set(chaves)) == 23
+
+def test_paginacao_com_filtros_e_busca(razao):
+    paginas = _todas_as_paginas(razao, data_ini="2025-01-02", data_fim="2025-01-04", valor_min=5)
+    linhas = [r for p in paginas for r in p.itertuples()]
+    assert all("2025-01-02" <= r.data <= "2025-01-04" and r.valor >= 5 for r in linhas)
+    assert len(linhas) == sum(1 for i in range(23) if 2 <= 1 + i % 5 <= 4 and i + 1 >= 5)
+    # A busca ignora acentos e casa prefixos
+    vendas = [r for p in _todas_as_paginas(razao, busca="vista") for r in p.itertuples()]
+    assert {r.historico for r in vendas} == {"Venda à vista"}
+    assert len([r for p in _todas_as_paginas(razao, busca="servico manut") for r in p.itertuples()]) == 8
+
+def test_pagina_unica_nao_devolve_chave(razao):
+    df, apos = listar_lancamentos(razao, limite=50)
+    assert len(df) == 23 and apos is None
+
+def test_paginacao_usa_o_indice_de_data_sem_ordenar(razao):
+    plano = " ".join(r['detail'] for r in db.get_db().execute(
+        """EXPLAIN QUERY PLAN SELECT id FROM vw_lancamentos WHERE empresa_id = ? AND (data, id) < (?, ?)
+           ORDER BY data DESC, id DESC LIMIT 51""", (razao, "2025-01-03", 10)))
+    assert "idx_lanc_emp_data" in plano and "TEMP B-TREE" not in plano
@@ -0,0 +1,67 @@
+import sqlite3
+import pytest
+from syscontabil import db, esquema
+from syscontabil.esquema import init_db
+from syscontabil.lancamentos import verificar_saldos
+from syscontabil.relatorios import balancete
+
+PLANO = [("1.01.01", "Caixa Geral", "Ativo"), ("4.01.01", "Receitas de Vendas", "Receita"), ("5.01.01", "Despesas Operacionais", "Despesa")]
+# Como o app antigo gravava: rótulo completo pela tela, código solto pelo CSV, e contas que já saíram do plano
+LANCAMENTOS = [
+    ("2025-01-05", "1.01.01 - Caixa Geral", "4.01.01 - Receitas de Vendas", 15.0),
+    ("2025-01-10", "1.01.01", "4.01.01", 7.0),
+    ("2025-02-03", "5.01.09 - Despesa Antiga", "1.01.01 - Caixa Geral", 4.0),
+    ("2025-02-04", "5.01.09", "1.01.01", 1.0),
+    ("2025-02-05", "9.99", "1.01.01", 0.5),
+]
+
+@pytest.fixture
+def banco_antigo(db_temp):
+    """Banco no esquema anterior às migrações (user_version 0), com janeiro fechado."""
+    conn = sqlite3.connect(db_temp)
+    esquema._migracao_1_esquema_base(conn)
+    conn.execute("INSERT INTO empresas (nome, regime, usuario_id) VALUES ('Antiga', 'Simples Nacional', 1)")
+    conn.executemany("INSERT INTO plano_contas (empresa_id, cod, nome, grupo) VALUES (1, ?, ?, ?)", PLANO)
+    conn.executemany("INSERT INTO lancamentos (empresa_id, data, conta_debito, conta_credito, valor, historico) VALUES (1, ?, ?, ?, ?, 'antigo')", LANCAMENTOS)
+    conn.execute("INSERT INTO fechamentos (empresa_id, mes_ano) VALUES (1, '2025-01')")
+    conn.commit()
+    conn.close()
+    return db_temp
+
+def _conferir():
+    conn = db.get_db()
+    assert conn.execute("SELECT count(*) FROM lancamentos WHERE conta_debito_id IS NULL OR conta_credito_id IS NULL").fetchone()[0] == 0
+    contas = conn.execute("SELECT cod, nome, count(*) AS n FROM plano_contas WHERE empresa_id = 1 GROUP BY cod, nome ORDER BY cod").fetchall()
+    assert [tuple(r) for r in contas] == [("1.01.01", "Caixa Geral", 1), ("4.01.01", "Receitas de Vendas", 1), ("5.01.01", "Despesas Operacionais", 1),
+                                          ("5.01.09", "Despesa Antiga", 1), ("9.99", "9.99", 1)]
+    assert verificar_saldos(1).empty
+    saldos = balancete(1).set_index('cod')['saldo']
+    assert saldos['1.01.01'] == pytest.approx(16.5)
+    assert saldos['4.01.01'] == pytest.approx(22.0)
+    assert saldos['5.01.09'] == pytest.approx(5.0)
+    # Retrato do mês fechado
+    assert balancete(1, None, "2025-01-31").set_index('cod')['saldo']['1.01.01'] == pytest.approx(22.0)
+
+def test_migra_rotulos_codigos_soltos_e_contas_orfas(banco_antigo):
+    init_db()
+    _conferir()
+
+def test_migracao_interrompida_retoma_sem_duplicar_contas(banco_antigo, monkeypatch):
+    with monkeypatch.context() as m:
+        m.setattr(esquema, 'LOTE_MIGRACAO', 2)
+        # Falha na troca final das tabelas, depois de criadas as contas órfãs e copiados os lotes
+        m.setattr(esquema, '_SQL_VIEW_LANCAMENTOS', "CREATE VIEW invalida AS SELEC")
+        with pytest.raises(sqlite3.OperationalError):
+            init_db()
+    assert db.get_db().execute("SELECT count(*) FROM lancamentos_v2").fetchone()[0] == len(LANCAMENTOS)
+    init_db()
+    _conferir()
+
+def test_init_db_nao_confirma_transacao_do_chamador(banco):
+    conn = db.get_db()
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("INSERT INTO empresas (nome) VALUES ('pendente')")
+    with pytest.raises(RuntimeError):
+        init_db()
+    conn.rollback()
+    assert conn.execute("SELECT count(*) FROM empresas").fetchone()[0] == 0
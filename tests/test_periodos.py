@@ -0,0 +1,54 @@
+import io
+import pytest
+from syscontabil import db, periodos
+from syscontabil.contas import conta_por_codigo
+from syscontabil.importacao import importar_csv
+from syscontabil.lancamentos import lancar, reconstruir_saldos
+from syscontabil.relatorios import balancete
+
+def _retrato(emp_id, mes):
+    rows = db.get_db().execute("SELECT conta_id, debito, credito FROM saldos_fechados WHERE empresa_id = ? AND mes = ?", (emp_id, mes))
+    return {r['conta_id']: (round(r['debito'], 2), round(r['credito'], 2)) for r in rows if r['debito'] or r['credito']}
+
+def _acumulado_bruto(emp_id, mes):
+    rows = db.get_db().execute("""
+        SELECT conta_id, sum(deb) AS debito, sum(crd) AS credito FROM (
+            SELECT conta_debito_id AS conta_id, valor AS deb, 0 AS crd FROM lancamentos WHERE empresa_id = :emp AND substr(data, 1, 7) <= :mes
+            UNION ALL
+            SELECT conta_credito_id, 0, valor FROM lancamentos WHERE empresa_id = :emp AND substr(data, 1, 7) <= :mes
+        ) GROUP BY conta_id""", {'emp': emp_id, 'mes': mes})
+    return {r['conta_id']: (round(r['debito'], 2), round(r['credito'], 2)) for r in rows}
+
+@pytest.fixture
+def contas(emp_id):
+    c = {cod: conta_por_codigo(emp_id, cod) for cod in ("1.01.01", "4.01.01", "5.01.01")}
+    lancar(emp_id, "2025-01-10", c["1.01.01"], c["4.01.01"], 100.0, "venda")
+    lancar(emp_id, "2025-02-10", c["5.01.01"], c["1.01.01"], 30.0, "despesa")
+    lancar(emp_id, "2025-03-10", c["1.01.01"], c["4.01.01"], 7.0, "venda")
+    return c
+
+def test_fechar_grava_o_retrato_acumulado(emp_id, contas):
+    periodos.fechar_periodo(emp_id, "2025-02")
+    assert _retrato(emp_id, "2025-02") == _acumulado_bruto(emp_id, "2025-02")
+    assert balancete(emp_id, None, "2025-02-28").set_index('cod').loc['1.01.01', 'saldo'] == 70.0
+
+def test_lancamento_em_mes_anterior_aberto_ajusta_os_retratos(emp_id, contas):
+    periodos.fechar_periodo(emp_id, "2025-01")
+    periodos.fechar_periodo(emp_id, "2025-02")
+    lancar(emp_id, "2024-12-20", contas["1.01.01"], contas["4.01.01"], 5.0, "venda antiga")
+    csv = "data,conta_debito,conta_credito,valor,historico\n2024-11-03,5.01.01,1.01.01,2.50,tarifa\n"
+    assert importar_csv(emp_id, io.BytesIO(csv.encode()))[0] == 1
+    for mes in ("2025-01", "2025-02"):
+        assert _retrato(emp_id, mes) == _acumulado_bruto(emp_id, mes)
+    assert balancete(emp_id, None, "2025-02-28").set_index('cod').loc['1.01.01', 'saldo'] == 72.5
+
+def test_reabrir_descarta_o_retrato_e_reconstruir_o_refaz(emp_id, contas):
+    periodos.fechar_periodo(emp_id, "2025-01")
+    periodos.fechar_periodo(emp_id, "2025-02")
+    fev = periodos.listar_fechamentos(emp_id).set_index('mes_ano').loc['2025-02', 'id']
+    periodos.reabrir_periodo(emp_id, int(fev))
+    assert _retrato(emp_id, "2025-02") == {}
+    with db.transacao() as conn:
+        conn.execute("UPDATE saldos_fechados SET debito = debito + 1")
+    reconstruir_saldos(emp_id)
+    assert _retrato(emp_id, "2025-01") == _acumulado_bruto(emp_id, "2025-01")
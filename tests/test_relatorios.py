@@ -0,0 +1,32 @@
+import pytest
+from syscontabil.contas import conta_por_codigo
+from syscontabil.lancamentos import lancar
+from syscontabil.relatorios import balancete
+
+@pytest.fixture
+def movimento(emp_id):
+    c = lambda cod: conta_por_codigo(emp_id, cod)
+    for data, deb, crd, valor in [("2025-01-05", "1.01.01", "4.01.01", 100.0), ("2025-01-20", "5.01.01", "1.01.01", 30.0),
+                                  ("2025-02-10", "1.01.02", "1.01.01", 50.0), ("2025-02-15", "1.01.01", "4.01.01", 12.5)]:
+        lancar(emp_id, data, c(deb), c(crd), valor, "teste")
+    return emp_id
+
+def test_balancete_soma_debitos_e_creditos_por_conta(movimento):
+    b = balancete(movimento).set_index('cod')
+    assert b.loc['1.01.01', ['debito', 'credito', 'saldo']].tolist() == [112.5, 80.0, 32.5]
+    assert b.loc['4.01.01', 'saldo'] == 112.5
+    assert b.loc['5.01.01', 'saldo'] == 30.0
+    assert b['debito'].sum() == b['credito'].sum()
+    # Contas sem movimento aparecem zeradas
+    assert b.loc['3.01.01', ['debito', 'credito', 'saldo']].tolist() == [0.0, 0.0, 0.0]
+
+def test_balancete_por_periodo_com_meses_quebrados(movimento):
+    b = balancete(movimento, "2025-01-10", "2025-02-12").set_index('cod')
+    assert b.loc['1.01.01', ['debito', 'credito']].tolist() == [0.0, 80.0]
+    assert b.loc['4.01.01', 'credito'] == 0.0
+
+def test_balancete_agrupado_por_nivel(movimento):
+    b = balancete(movimento, nivel=2).set_index('cod')
+    # 1.01.01 e 1.01.02 somam em 1.01
+    assert b.loc['1.01', ['debito', 'credito', 'saldo']].tolist() == [162.5, 80.0, 82.5]
+    assert b.loc['1.01', 'nome'] == '1.01'
@@ -0,0 +1,62 @@
+import threading
+import time
+import pytest
+from syscontabil import db, tarefas
+
+liberar = threading.Event()
+
+@tarefas.tarefa('teste_escrita', escrita=True)
+def _escrita(emp_id, parametros, entrada, progresso, ao_confirmar):
+    liberar.wait(10)
+    with db.transacao() as conn:
+        ao_confirmar(conn)
+    return {}
+
+@tarefas.tarefa('teste_leitura')
+def _leitura(emp_id, parametros, entrada, progresso, ao_confirmar):
+    return {'ok': True}
+
+@pytest.fixture
+def fila(banco):
+    liberar.clear()
+    yield
+    liberar.set()
+
+def _esperar(tarefa_id, situacao, limite=10):
+    fim = time.time() + limite
+    while (t := tarefas.consultar(tarefa_id))['situacao'] != situacao:
+        assert time.time() < fim, t
+        time.sleep(0.02)
+    return t
+
+def test_escritas_na_fila_nao_ocupam_as_threads_de_leitura(fila):
+    escritas = [tarefas.enfileirar(1, 1, 'teste_escrita', {'n': n}) for n in range(tarefas.TRABALHADORES + 1)]
+    leitura = tarefas.enfileirar(1, 1, 'teste_leitura')
+    assert _esperar(leitura, 'concluida')['resultado'] == {'ok': True}
+    assert [tarefas.consultar(i)['situacao'] for i in escritas[1:]] == ['pendente'] * tarefas.TRABALHADORES
+    liberar.set()
+    for i in escritas:
+        # A mensagem "Em execução..." não sobra na tarefa concluída
+        assert _esperar(i, 'concluida')['mensagem'] is None
+
+def _csv(linhas):
+    return ("data,conta_debito,conta_credito,valor,historico\n" + "".join(
+        f"2025-01-{d:02d},1.01.01,4.01.01,{d}.00,venda {d}\n" for d in range(1, linhas + 1))).encode()
+
+def test_gravacao_concluida_pode_rodar_de_novo(emp_id):
+    from syscontabil.lancamentos import excluir_lancamento
+    primeira = tarefas.enfileirar(1, emp_id, 'importar_csv', entrada=_csv(3))
+    assert _esperar(primeira, 'concluida')['resultado']['aceitos'] == 3
+    conn = db.get_db()
+    for (lanc_id,) in conn.execute("SELECT id FROM lancamentos").fetchall():
+        excluir_lancamento(emp_id, lanc_id)
+    # O mesmo arquivo, depois de excluídos os lançamentos, é importado de novo
+    segunda = tarefas.enfileirar(1, emp_id, 'importar_csv', entrada=_csv(3))
+    assert _esperar(segunda, 'concluida')['resultado']['aceitos'] == 3
+    assert conn.execute("SELECT count(*) FROM lancamentos").fetchone()[0] == 3
+
+def test_tarefa_ativa_nao_e_duplicada(fila):
+    primeira = tarefas.enfileirar(1, 1, 'teste_escrita', {'n': 'unica'})
+    assert tarefas.enfileirar(1, 1, 'teste_escrita', {'n': 'unica'}) == primeira
+    liberar.set()
+    _esperar(primeira, 'concluida')